@@ -1,14 +1,41 @@
-from flask import Flask
+from flask import Flask, Response, abort, jsonify, send_from_directory
 from flask_jwt import jwt
-from db import db
+from db import db, init_engine
 from flask_cors import CORS
-from db_config import DATABASE_URI
+from db_config import (
+    DATABASE_URI,
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+)
 from controllers.users import users_bp
 from controllers.outfits import outfits_bp
 from dotenv import load_dotenv
 from datetime import timedelta
 from flask_migrate import Migrate
+from core.search import rebuild_search_index
+from core.engagement import reconcile_counters
+from core.notifications import reconcile_unread_counts, run_notification_worker
+from core.timeline import rebuild_timelines, trim_timelines
+from core.push import purge_old_messages, run_push_worker
+from core.images import run_image_worker
+from core.config import LOCAL_STORAGE_DIR, STORAGE_BACKEND
+from core.cache import cache_stats
+from core.blocklist import purge_expired_tokens
+from core.scheduler import run_scheduler
+from core.query_plans import check_query_plans
+from core.query_budget import check_query_budgets
+from core.synthetic import seed_database
+from core.benchmark import SCENARIOS, compare_results, run_benchmark
+from core.metrics import (
+    init_app as init_metrics,
+    metrics_authorized,
+    render_metrics,
+)
 
+import click
+import json
 import os
 
 
@@ -20,6 +47,17 @@ def create_app() -> Flask:
     CORS(app, resources={r"/*": {"origins": "*"}})
 
     app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URI
+
+    # SQLite keeps its default pool, it has no server side to size it for.
+    if DATABASE_URI and not DATABASE_URI.startswith("sqlite"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": True,
+        }
+
     app.config["JWT_SECRET_KEY"] = os.environ.get("JWT_SECRET")
     app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(minutes=60)
     app.config["MAX_CONTENT_LENGTH"] = 100 * 1024 * 1024
@@ -29,8 +67,145 @@ def create_app() -> Flask:
 
     jwt.init_app(app)
     db.init_app(app)
+    init_engine(app)
 
     Migrate(app, db)
+    init_metrics(app)
+
+    if STORAGE_BACKEND == "local":
+
+        @app.route("/media/<path:key>")
+        def media(key):
+            return send_from_directory(LOCAL_STORAGE_DIR, key)
+
+    # Metrics name routes and queries, so they are only served with the token
+    # and answer 404 otherwise.
+    @app.route("/metrics")
+    def metrics():
+        if not metrics_authorized():
+            abort(404)
+
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+    @app.route("/metrics/cache")
+    def cache_metrics():
+        if not metrics_authorized():
+            abort(404)
+
+        return jsonify(cache_stats()), 200
+
+    @app.cli.command("rebuild-search-index")
+    def rebuild_search_index_command():
+        print(f"Indexed {rebuild_search_index()} outfits")
+
+    @app.cli.command("reconcile-counters")
+    def reconcile_counters_command():
+        print(f"Repaired {reconcile_counters() + reconcile_unread_counts()} rows")
+
+    @app.cli.command("rebuild-timelines")
+    def rebuild_timelines_command():
+        print(f"Rebuilt timelines, trimmed {rebuild_timelines()} entries")
+
+    @app.cli.command("trim-timelines")
+    def trim_timelines_command():
+        print(f"Trimmed {trim_timelines()} entries")
+
+    @app.cli.command("push-worker")
+    def push_worker_command():
+        run_push_worker()
+
+    @app.cli.command("notification-worker")
+    def notification_worker_command():
+        run_notification_worker()
+
+    @app.cli.command("image-worker")
+    def image_worker_command():
+        run_image_worker()
+
+    @app.cli.command("purge-token-blocklist")
+    def purge_token_blocklist_command():
+        print(f"Purged {purge_expired_tokens()} expired tokens")
+
+    @app.cli.command("purge-push-messages")
+    def purge_push_messages_command():
+        print(f"Purged {purge_old_messages()} push messages")
+
+    @app.cli.command("scheduler")
+    def scheduler_command():
+        run_scheduler(app)
+
+    @app.cli.command("check-query-plans")
+    def check_query_plans_command():
+        failures = check_query_plans()
+
+        for name, tables in failures.items():
+            print(f"{name}: full scan of {', '.join(tables)}")
+
+        if failures:
+            raise SystemExit(1)
+
+        print("All hot queries use indexes")
+
+    @app.cli.command("check-query-budgets")
+    def check_query_budgets_command():
+        failures = check_query_budgets(app)
+
+        for path, failure in failures.items():
+            print(f"GET {path}: {failure}")
+
+        if failures:
+            raise SystemExit(1)
+
+        print("All endpoints are within their query budgets")
+
+    @app.cli.command("seed-benchmark")
+    @click.option("--users", default=1000, show_default=True)
+    @click.option("--outfits", default=10000, show_default=True)
+    @click.option("--follows", default=30.0, show_default=True, help="Mean per user.")
+    @click.option("--likes", default=8.0, show_default=True, help="Mean per outfit.")
+    @click.option("--comments", default=1.5, show_default=True, help="Mean per outfit.")
+    @click.option(
+        "--comment-likes", default=1.0, show_default=True, help="Mean per comment."
+    )
+    @click.option("--seed", default=1, show_default=True)
+    def seed_benchmark_command(
+        users, outfits, follows, likes, comments, comment_likes, seed
+    ):
+        db.create_all()
+        counts = seed_database(
+            users,
+            outfits,
+            follows=follows,
+            likes=likes,
+            comments=comments,
+            comment_likes=comment_likes,
+            seed=seed,
+        )
+
+        for table, count in counts.items():
+            print(f"{table}: {count}")
+
+    @app.cli.command("benchmark")
+    @click.option("--requests", default=200, show_default=True, help="Per scenario.")
+    @click.option(
+        "--scenario", "scenarios", multiple=True, type=click.Choice(list(SCENARIOS))
+    )
+    @click.option("--seed", default=1, show_default=True)
+    @click.option("--output", type=click.Path(), help="Write the results as JSON.")
+    @click.option("--baseline", type=click.Path(exists=True), help="Earlier results.")
+    def benchmark_command(requests, scenarios, seed, output, baseline):
+        results = run_benchmark(app, requests, list(scenarios) or None, seed)
+
+        if output:
+            with open(output, "w") as f:
+                json.dump(results, f, indent=2)
+        else:
+            print(json.dumps(results, indent=2))
+
+        if baseline:
+            with open(baseline) as f:
+                for line in compare_results(json.load(f), results):
+                    print(line)
 
     return app
 
@@ -9,36 +9,62 @@ from models import (
     User,
     OutfitHashtag,
     Follow,
-    Notification,
     CommentAnswer,
     OutfitLink,
     OutfitImage,
+    outfit_like,
+    outfit_save,
 )
-from db import db
+from db import db, insert_all
 from datetime import datetime
+from base64 import b64decode
+from io import BytesIO
 from sqlalchemy import desc
 from dotenv import load_dotenv
-from core.s3 import upload_to_s3
-from util import send_push_notification, is_valid_url
+from core.s3 import check_dimensions, get_image_format
+from core.images import stage_image, stage_upload
+from core.uploads import open_upload
+from core.cache import cached, invalidate, invalidate_outfit
+from core.notifications import record_event
+from core.links import invalid_urls
 from sqlalchemy import or_
-from core.search import search_outfits, search_outfits_by_hashtag
+from core.search import (
+    search_outfits,
+    index_outfit,
+    remove_outfit_from_index,
+)
+from core.engagement import (
+    add_engagement,
+    adjust_counter,
+    remove_engagement,
+    remove_outfit_counters,
+)
+from core.hashtags import (
+    add_outfit_hashtags,
+    normalize_hashtag,
+    remove_outfit_hashtags,
+    trending_hashtags,
+)
+from core.timeline import fan_out_outfit, remove_outfit_from_timelines
+from core.fields import get_fields, select_fields
+from core.pagination import get_limit, paginate, paginated_response
+from core.serializers import (
+    serialize_new_outfit,
+    serialize_outfits,
+    serialize_comments,
+    serialize_comment_answers,
+)
 import uuid
 
 load_dotenv()
 
 
-def create_notification(user_id, action_type, entity_id, entity_type, sender_id):
-    id = str(uuid.uuid4())
-    notification = Notification(
-        id=id,
-        user_id=user_id,
-        action_type=action_type,
-        entity_id=entity_id,
-        entity_type=entity_type,
-        sender_id=sender_id,
+def create_notification(
+    user_id, action_type, entity_id, entity_type, sender_id, group_entity_id=None
+):
+    record_event(
+        user_id, action_type, entity_id, entity_type, sender_id, group_entity_id
     )
-    db.session.add(notification)
-    db.session.commit()
 
 
 outfits_bp = Blueprint("outfits", __name__, url_prefix="/outfits")
@@ -50,23 +76,28 @@ outfits_bp = Blueprint("outfits", __name__, url_prefix="/outfits")
 def get_outfits() -> tuple[Response, int]:
     current_user_id = get_jwt_identity()
 
-    accepted_follows = Follow.query.filter_by(
-        follower_id=current_user_id, status="Accepted"
-    ).all()
-    accepted_followee_ids = [follow.followee_id for follow in accepted_follows]
+    accepted_followee_ids = [
+        followee_id
+        for (followee_id,) in db.session.query(Follow.followee_id).filter_by(
+            follower_id=current_user_id, status="Accepted"
+        )
+    ]
 
     accepted_followee_ids.append(current_user_id)
 
-    outfits = (
-        Outfit.query.join(User, User.id == Outfit.user_id)
-        .filter(
-            or_(Outfit.user_id.in_(accepted_followee_ids), User.is_private == False)
-        )
-        .order_by(desc(Outfit.created_at))
-        .all()
+    query = Outfit.query.join(User, User.id == Outfit.user_id).filter(
+        or_(Outfit.user_id.in_(accepted_followee_ids), User.is_private == False)
     )
 
-    return jsonify([outfit.to_dict() for outfit in outfits]), 200
+    try:
+        outfits, next_cursor = paginate(query, Outfit.created_at, Outfit.id)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    return (
+        paginated_response(serialize_outfits(outfits, get_fields()), next_cursor),
+        200,
+    )
 
 
 # GET /outfits/:id
@@ -78,7 +109,9 @@ def get_outfit(id: str) -> tuple[Response, int]:
     if outfit is None:
         return jsonify({"message": "Outfit not found"}), 404
 
-    return jsonify(outfit.to_dict()), 200
+    outfit_dict = cached("outfit", outfit.id, lambda: serialize_outfits([outfit])[0])
+
+    return jsonify(select_fields(outfit_dict, get_fields())), 200
 
 
 # GET /outfits/user/:id
@@ -90,43 +123,74 @@ def get_outfits_by_user(id: str) -> tuple[Response, int]:
     if len(outfits) == 0:
         return jsonify({"message": "User has no outfits"}), 404
 
-    return jsonify([outfit.to_dict() for outfit in outfits]), 200
+    return jsonify(serialize_outfits(outfits, get_fields())), 200
 
 
 # GET /outfits/search/:query
 @outfits_bp.route("/search/<query>", methods=["GET"])
 @jwt_required()
 def search_outfits_route(query: str) -> tuple[Response, int]:
-    outfits = Outfit.query.join(User, User.id == Outfit.user_id).all()
+    try:
+        limit = get_limit()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
-    if len(outfits) == 0:
-        return jsonify({"message": "No outfits found"}), 404
+    outfit_ids = search_outfits(query, limit)
 
-    search_results = search_outfits([outfit.to_dict() for outfit in outfits], query)
+    if len(outfit_ids) == 0:
+        if db.session.query(Outfit.id).first() is None:
+            return jsonify({"message": "No outfits found"}), 404
 
-    if len(search_results) == 0:
         return jsonify({"message": "No outfits found"}), 200
 
+    outfits = {
+        outfit.id: outfit
+        for outfit in Outfit.query.filter(Outfit.id.in_(outfit_ids)).all()
+    }
+    search_results = serialize_outfits(
+        [outfits[outfit_id] for outfit_id in outfit_ids if outfit_id in outfits],
+        get_fields(),
+    )
+
     return jsonify(search_results), 200
 
 
 # GET /outfits/search/hashtag/:hashtag
 @outfits_bp.route("/search/hashtag/<hashtag>", methods=["GET"])
+@outfits_bp.route("/hashtags/<hashtag>", methods=["GET"])
 @jwt_required()
-def search_outfits_by_hashtag_route(query: str, hashtag: str) -> tuple[Response, int]:
-    outfits = Outfit.query.join(User, User.id == Outfit.user_id).all()
+def search_outfits_by_hashtag_route(hashtag: str) -> tuple[Response, int]:
+    query = (
+        Outfit.query.join(OutfitHashtag, OutfitHashtag.outfit_id == Outfit.id)
+        .filter(OutfitHashtag.normalized == normalize_hashtag(hashtag))
+        .distinct()
+    )
+
+    try:
+        outfits, next_cursor = paginate(query, Outfit.created_at, Outfit.id)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
     if len(outfits) == 0:
-        return jsonify({"message": "No outfits found"}), 404
+        return jsonify({"message": "No outfits found with the specified hashtag"}), 200
 
-    search_results = search_outfits_by_hashtag(
-        [outfit.to_dict() for outfit in outfits], query, hashtag.lower()
+    return (
+        paginated_response(serialize_outfits(outfits, get_fields()), next_cursor),
+        200,
     )
 
-    if len(search_results) == 0:
-        return jsonify({"message": "No outfits found with the specified hashtag"}), 200
 
-    return jsonify(search_results), 200
+# GET /outfits/trending-hashtags
+@outfits_bp.route("/trending-hashtags", methods=["GET"])
+@jwt_required()
+def get_trending_hashtags() -> tuple[Response, int]:
+    try:
+        days = max(1, min(int(request.args.get("days", 7)), 90))
+        limit = get_limit(default=10)
+    except ValueError:
+        return jsonify({"message": "Invalid days or limit"}), 400
+
+    return jsonify(trending_hashtags(days, limit)), 200
 
 
 # POST /outfits/upload
@@ -159,6 +223,39 @@ def create_outfit():
     data.pop("outfit_links")
     data.pop("outfit_images")
 
+    image_uploads = []
+    if outfit_images is not None and type(outfit_images) == list:
+        for outfit_image in outfit_images:
+            try:
+                image_data = b64decode(outfit_image)
+            except ValueError:
+                return jsonify({"message": "Invalid image data"}), 400
+
+            if get_image_format(image_data[:8]) == "UNKNOWN":
+                return jsonify({"message": "Unknown image format"}), 400
+
+            try:
+                check_dimensions(BytesIO(image_data))
+            except ValueError as e:
+                return jsonify({"message": str(e)}), 400
+
+            image_uploads.append(image_data)
+
+    if outfit_links is None or type(outfit_links) != list:
+        outfit_links = []
+
+    for outfit_link in outfit_links:
+        if type(outfit_link) != dict or type(outfit_link.get("link")) != str:
+            return jsonify({"message": "Invalid URL"}), 400
+
+    # Everything is checked before the first image is staged or row written,
+    # so a bad link cannot leave half an outfit behind.
+    if invalid_urls(outfit_link["link"] for outfit_link in outfit_links):
+        return jsonify({"message": "Invalid URL"}), 400
+
+    if hashtags is None or type(hashtags) != list:
+        hashtags = []
+
     user = User.query.get(get_jwt_identity())
 
     current_time = datetime.utcnow()
@@ -177,44 +274,72 @@ def create_outfit():
     user.last_upload_time = current_time
 
     outfit = Outfit(**data)
-    db.session.add(outfit)
-    db.session.flush()
+    images = [stage_image(image_data, outfit.id) for image_data in image_uploads]
+    links = [
+        OutfitLink(
+            id=str(uuid.uuid4()),
+            outfit_id=outfit.id,
+            description=outfit_link.get("description"),
+            link=outfit_link["link"],
+        )
+        for outfit_link in outfit_links
+    ]
 
-    if hashtags is not None and type(hashtags) == list:
-        for hashtag in hashtags:
-            outfit_hashtag = OutfitHashtag(
-                id=str(uuid.uuid4()), outfit_id=outfit.id, hashtag=hashtag
-            )
-            db.session.add(outfit_hashtag)
+    # The outfit and its children go in as one multi-row INSERT per table and
+    # the response is built from these objects, nothing is read back.
+    insert_all([outfit, *images, *links])
+    outfit_hashtags = add_outfit_hashtags(outfit, hashtags)
+    index_outfit(outfit, user.username, hashtags)
+    fan_out_outfit(outfit)
+
+    invalidate("user", outfit.user_id)
+    db.session.commit()
+
+    return (
+        jsonify(serialize_new_outfit(outfit, user, outfit_hashtags, images, links)),
+        201,
+    )
+
+
+# GET /outfits/:id/images
+@outfits_bp.route("/<id>/images", methods=["GET"])
+@jwt_required()
+def get_outfit_images(id: str) -> tuple[Response, int]:
+    if db.session.query(Outfit.id).filter_by(id=id).first() is None:
+        return jsonify({"message": "Outfit not found"}), 404
+
+    images = OutfitImage.query.filter_by(outfit_id=id).all()
+
+    return jsonify([image.to_dict() for image in images]), 200
 
-    if outfit_images is not None and type(outfit_images) == list:
-        for outfit_image in outfit_images:
-            img = {"image_url": None, "id": str(uuid.uuid4()), "outfit_id": outfit.id}
 
-            img["image_url"] = upload_to_s3(outfit_image, outfit.id, "outfit_image")
+# POST /outfits/:id/images
+@outfits_bp.route("/<id>/images", methods=["POST"])
+@jwt_required()
+def upload_outfit_image(id: str) -> tuple[Response, int]:
+    outfit = Outfit.query.filter_by(id=id).first()
 
-            outfit_image = OutfitImage(**img)
-            db.session.add(outfit_image)
+    if outfit is None:
+        return jsonify({"message": "Outfit not found"}), 404
 
-    if outfit_links is not None and type(outfit_links) == list:
-        for outfit_link in outfit_links:
-            link = {
-                "link": None,
-                "id": str(uuid.uuid4()),
-                "outfit_id": outfit.id,
-                "description": outfit_link["description"],
-                "link": outfit_link["link"],
-            }
+    if outfit.user_id != get_jwt_identity():
+        return jsonify({"message": "You can only add images to your own outfits"}), 403
 
-            if not is_valid_url(outfit_link["link"]):
-                return jsonify({"message": "Invalid URL"}), 400
+    try:
+        first_chunk, stream = open_upload()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
-            outfit_link = OutfitLink(**link)
-            db.session.add(outfit_link)
+    try:
+        image = stage_upload(first_chunk, stream, outfit.id)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
+    db.session.add(image)
+    invalidate_outfit(outfit)
     db.session.commit()
 
-    return jsonify(outfit.to_dict()), 201
+    return jsonify(image.to_dict()), 201
 
 
 # PUT /outfits/:id
@@ -236,9 +361,14 @@ def update_outfit(id: str) -> tuple[Response, int]:
 
     outfit.updated_at = datetime.utcnow()
 
+    index_outfit(
+        outfit, outfit.user.username, [hashtag.hashtag for hashtag in outfit.hashtags]
+    )
+
+    invalidate_outfit(outfit)
     db.session.commit()
 
-    return jsonify(outfit.to_dict()), 200
+    return jsonify(serialize_outfits([outfit])[0]), 200
 
 
 # DELETE /outfits/:id
@@ -250,7 +380,12 @@ def delete_outfit(id: str) -> tuple[Response, int]:
     if outfit is None:
         return jsonify({"message": "Outfit not found"}), 404
 
+    remove_outfit_from_index(outfit.id)
+    remove_outfit_hashtags(outfit)
+    remove_outfit_counters(outfit)
+    remove_outfit_from_timelines(outfit.id)
     db.session.delete(outfit)
+    invalidate_outfit(outfit)
     db.session.commit()
 
     return jsonify({"message": "Outfit deleted"}), 200
@@ -266,21 +401,15 @@ def like_outfit(id: str) -> tuple[Response, int]:
         return jsonify({"message": "Outfit not found"}), 404
 
     user_id = get_jwt_identity()
-    user = User.query.get(user_id)
 
-    if user in outfit.likes:
+    if not add_engagement(outfit_like, outfit, user_id):
         return jsonify({"message": "Outfit already liked"}), 400
 
-    outfit.likes.append(user)
-
     if outfit.user_id != user_id:
         create_notification(outfit.user_id, "like", outfit.id, "outfit", user_id)
-        send_push_notification(
-            outfit.user.expo_push_token,
-            "GotStyle",
-            f"{user.username} liked your outfit!",
-        )
 
+    invalidate_outfit(outfit)
+    invalidate("user", user_id)
     db.session.commit()
 
     return jsonify({"message": "Outfit liked"}), 200
@@ -296,13 +425,12 @@ def unlike_outfit(id: str) -> tuple[Response, int]:
         return jsonify({"message": "Outfit not found"}), 404
 
     user_id = get_jwt_identity()
-    user = User.query.get(user_id)
 
-    if user not in outfit.likes:
+    if not remove_engagement(outfit_like, outfit, user_id):
         return jsonify({"message": "Outfit not liked"}), 400
 
-    outfit.likes.remove(user)
-
+    invalidate_outfit(outfit)
+    invalidate("user", user_id)
     db.session.commit()
 
     return jsonify({"message": "Outfit unliked"}), 200
@@ -313,7 +441,6 @@ def unlike_outfit(id: str) -> tuple[Response, int]:
 @jwt_required()
 def comment_outfit(id: str) -> tuple[Response, int]:
     user_id = get_jwt_identity()
-    user = User.query.get(user_id)
     outfit = Outfit.query.filter_by(id=id).first()
 
     if outfit is None:
@@ -333,18 +460,16 @@ def comment_outfit(id: str) -> tuple[Response, int]:
     comment = Comment(**data)
 
     if outfit.user_id != user_id:
-        create_notification(outfit.user_id, "comment", comment.id, "comment", user_id)
-        if outfit.user.expo_push_token:
-            send_push_notification(
-                outfit.user.expo_push_token,
-                "GotStyle",
-                f"{user.username} commented on your outfit!",
-            )
+        create_notification(
+            outfit.user_id, "comment", comment.id, "comment", user_id, outfit.id
+        )
 
     db.session.add(comment)
+    adjust_counter(outfit, "comment_count", 1)
+    invalidate_outfit(outfit)
     db.session.commit()
 
-    return jsonify(comment.to_dict()), 201
+    return jsonify(serialize_comments([comment])[0]), 201
 
 
 # GET /outfits/:id/comment/:comment_id
@@ -361,7 +486,12 @@ def get_comment(id: str, comment_id: str) -> tuple[Response, int]:
     if comment is None:
         return jsonify({"message": "Comment not found"}), 404
 
-    return jsonify(comment.to_dict()), 200
+    return (
+        jsonify(
+            cached("comment", comment.id, lambda: serialize_comments([comment])[0])
+        ),
+        200,
+    )
 
 
 # POST /outfits/:id/comment/:comment_id/reply/:reply_id/like
@@ -395,13 +525,9 @@ def like_comment_answer(
 
     if reply.user_id != user_id:
         create_notification(reply.user_id, "like", reply.id, "comment_answer", user_id)
-        if reply.user.expo_push_token:
-            send_push_notification(
-                reply.user.expo_push_token,
-                "GotStyle",
-                f"{user.username} liked your reply!",
-            )
 
+    invalidate_outfit(outfit)
+    invalidate("comment", comment.id)
     db.session.commit()
 
     return jsonify({"message": "Reply liked"}), 200
@@ -412,7 +538,6 @@ def like_comment_answer(
 @jwt_required()
 def reply_comment(id: str, comment_id: str) -> tuple[Response, int]:
     user_id = get_jwt_identity()
-    user = User.query.get(user_id)
     outfit = Outfit.query.filter_by(id=id).first()
     comment = Comment.query.filter_by(id=comment_id).first()
 
@@ -439,19 +564,20 @@ def reply_comment(id: str, comment_id: str) -> tuple[Response, int]:
 
     if comment.user_id != user_id:
         create_notification(
-            comment.user_id, "reply", comment_answer.id, "comment_answer", user_id
+            comment.user_id,
+            "reply",
+            comment_answer.id,
+            "comment_answer",
+            user_id,
+            comment.id,
         )
-        if comment.user.expo_push_token:
-            send_push_notification(
-                comment.user.expo_push_token,
-                "GotStyle",
-                f"{user.username} replied to your comment!",
-            )
 
     db.session.add(comment_answer)
+    invalidate_outfit(outfit)
+    invalidate("comment", comment.id)
     db.session.commit()
 
-    return jsonify(comment_answer.to_dict()), 201
+    return jsonify(serialize_comment_answers([comment_answer])[0]), 201
 
 
 # POST /outfits/:id/comment/:comment_id/like
@@ -478,13 +604,9 @@ def like_comment(id: str, comment_id: str) -> tuple[Response, int]:
 
     if comment.user_id != user_id:
         create_notification(comment.user_id, "like", comment.id, "comment", user_id)
-        if comment.user.expo_push_token:
-            send_push_notification(
-                comment.user.expo_push_token,
-                "GotStyle",
-                f"{user.username} liked your comment!",
-            )
 
+    invalidate_outfit(outfit)
+    invalidate("comment", comment.id)
     db.session.commit()
 
     return jsonify({"message": "Comment liked"}), 200
@@ -512,6 +634,8 @@ def unlike_comment(id: str, comment_id: str) -> tuple[Response, int]:
 
     comment.likes.remove(user)
 
+    invalidate_outfit(outfit)
+    invalidate("comment", comment.id)
     db.session.commit()
 
     return jsonify({"message": "Comment unliked"}), 200
@@ -527,22 +651,15 @@ def save_outfit(id: str) -> tuple[Response, int]:
         return jsonify({"message": "Outfit not found"}), 404
 
     user_id = get_jwt_identity()
-    user = User.query.get(user_id)
 
-    if user in outfit.saves:
+    if not add_engagement(outfit_save, outfit, user_id):
         return jsonify({"message": "Outfit already saved"}), 400
 
     if outfit.user_id != user_id:
         create_notification(outfit.user_id, "save", outfit.id, "outfit", user_id)
-        if outfit.user.expo_push_token:
-            send_push_notification(
-                outfit.user.expo_push_token,
-                "GotStyle",
-                f"{user.username} saved your outfit!",
-            )
-
-    outfit.saves.append(user)
 
+    invalidate_outfit(outfit)
+    invalidate("user", user_id)
     db.session.commit()
 
     return jsonify({"message": "Outfit saved"}), 200
@@ -558,13 +675,12 @@ def unsave_outfit(id: str) -> tuple[Response, int]:
         return jsonify({"message": "Outfit not found"}), 404
 
     user_id = get_jwt_identity()
-    user = User.query.get(user_id)
 
-    if user not in outfit.saves:
+    if not remove_engagement(outfit_save, outfit, user_id):
         return jsonify({"message": "Outfit not saved"}), 400
 
-    outfit.saves.remove(user)
-
+    invalidate_outfit(outfit)
+    invalidate("user", user_id)
     db.session.commit()
 
     return jsonify({"message": "Outfit unsaved"}), 200
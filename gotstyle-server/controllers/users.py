@@ -6,15 +6,57 @@ from flask_jwt_extended import (
     create_refresh_token,
     get_jwt,
 )
-from models import User, TokenBlockList, Follow, Notification
+from models import (
+    User,
+    TokenBlockList,
+    Follow,
+    Notification,
+    Outfit,
+    TimelineEntry,
+    outfit_like,
+    outfit_save,
+)
 from db import db
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta, time
-from util import check_email, get_dark_color, send_push_notification
+from base64 import b64decode
+from io import BytesIO
+from util import check_email, get_dark_color
+from core.push import enqueue_push_notification
 from flask.wrappers import Response
-from core.s3 import upload_to_s3
-from core.search import search_users
-from sqlalchemy import desc
+from core.s3 import upload_image
+from core.uploads import open_upload, spool_upload
+from core.cache import cached, invalidate
+from core.blocklist import blocklist
+from core.notifications import (
+    add_notification,
+    delete_notification,
+    mark_all_read,
+    mark_read,
+)
+from core.search import search_users, reindex_username
+from core.fields import get_fields, select_fields
+from core.metrics import timed
+from core.pagination import (
+    decode_rank_cursor,
+    encode_rank_cursor,
+    get_limit,
+    paginate,
+    paginated_response,
+)
+from core.social_graph import follow_graph, top_scores
+from core.timeline import (
+    backfill_timeline,
+    hydrate_timeline,
+    remove_author_from_timeline,
+    timeline_query,
+)
+from core.serializers import (
+    serialize_users,
+    serialize_outfits,
+    serialize_notifications,
+    serialize_user_profiles,
+)
 from dotenv import load_dotenv
 import uuid
 import requests
@@ -30,7 +72,7 @@ users_bp = Blueprint("users", __name__, url_prefix="/users")
 @jwt_required()
 def get_users() -> tuple[Response, int]:
     users = User.query.all()
-    return jsonify([user.to_dict() for user in users]), 200
+    return jsonify(serialize_users(users, get_fields())), 200
 
 
 # GET /users/available-username
@@ -54,14 +96,19 @@ def get_following_outfits_by_id(id: str):
     if user is None:
         return jsonify({"message": "User not found"}), 404
 
-    following = user.following
-
-    outfits = []
+    try:
+        entries, next_cursor = paginate(
+            timeline_query(user.id), TimelineEntry.created_at, TimelineEntry.outfit_id
+        )
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
-    for follow in following:
-        outfits.extend(follow.outfits)
+    outfits = hydrate_timeline(entries)
 
-    return jsonify([outfit.to_dict() for outfit in outfits]), 200
+    return (
+        paginated_response(serialize_outfits(outfits, get_fields()), next_cursor),
+        200,
+    )
 
 
 # GET /users/available-email
@@ -80,93 +127,75 @@ def get_available_email() -> tuple[Response, int]:
 @users_bp.route("/unread-notifications", methods=["GET"])
 @jwt_required()
 def get_notifications():
-    user = User.query.filter_by(id=get_jwt_identity()).first()
-    notifications = (
-        Notification.query.filter_by(user_id=user.id, is_read=False)
-        .order_by(desc(Notification.created_at))
-        .all()
-    )
-
-    return (
-        jsonify(
-            [notification.to_dict() for notification in notifications]
-            if notifications
-            else []
-        ),
-        200,
-    )
+    query = Notification.query.filter_by(user_id=get_jwt_identity(), is_read=False)
 
+    try:
+        notifications, next_cursor = paginate(
+            query, Notification.created_at, Notification.id
+        )
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
-# GET /users/read-notifications
-@users_bp.route("/read-notifications", methods=["GET"])
-@jwt_required()
-def get_read_notifications():
-    user = User.query.filter_by(id=get_jwt_identity()).first()
-    notifications = (
-        Notification.query.filter_by(user_id=user.id, is_read=True)
-        .order_by(desc(Notification.created_at))
-        .all()
-    )
-
-    return (
-        jsonify(
-            [notification.to_dict() for notification in notifications]
-            if notifications
-            else []
-        ),
-        200,
-    )
+    return paginated_response(serialize_notifications(notifications), next_cursor), 200
 
 
-# GET /users/closest-users
-@users_bp.route("/closest-users", methods=["GET"])
+# GET /users/unread-notifications/count
+@users_bp.route("/unread-notifications/count", methods=["GET"])
 @jwt_required()
-def get_closest_users() -> tuple[Response, int]:
-    current_user_id = get_jwt_identity()
-    current_user = User.query.filter_by(id=current_user_id).first()
+def get_unread_notification_count() -> tuple[Response, int]:
+    count = (
+        db.session.query(User.unread_notification_count)
+        .filter_by(id=get_jwt_identity())
+        .scalar()
+    )
 
-    if current_user is None:
+    if count is None:
         return jsonify({"message": "User not found"}), 404
 
-    all_users = User.query.all()
+    return jsonify({"count": count}), 200
 
-    if all_users is None:
-        return jsonify({"message": "No users found"}), 404
 
-    closest_users = []
-    for user in all_users:
-        if user.id == current_user_id:
-            continue
+# GET /users/read-notifications
+@users_bp.route("/read-notifications", methods=["GET"])
+@jwt_required()
+def get_read_notifications():
+    query = Notification.query.filter_by(user_id=get_jwt_identity(), is_read=True)
 
-        is_following = (
-            db.session.query(Follow)
-            .filter_by(
-                follower_id=current_user_id, followee_id=user.id, status="Accepted"
-            )
-            .first()
-        )
-        is_followed = (
-            db.session.query(Follow)
-            .filter_by(
-                followee_id=current_user_id, follower_id=user.id, status="Accepted"
-            )
-            .first()
+    try:
+        notifications, next_cursor = paginate(
+            query, Notification.created_at, Notification.id
         )
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
-        score = 0
-        if is_following and is_followed:
-            score = 2
-        elif is_following or is_followed:
-            score = 1
+    return paginated_response(serialize_notifications(notifications), next_cursor), 200
 
-        closest_users.append((user, score))
 
-    closest_users.sort(key=lambda x: x[1], reverse=True)
-    closest_users_json = [
-        {"user": user.to_dict(), "score": score} for user, score in closest_users
+# GET /users/closest-users
+@users_bp.route("/closest-users", methods=["GET"])
+@jwt_required()
+def get_closest_users() -> tuple[Response, int]:
+    try:
+        limit = get_limit()
+        cursor = request.args.get("cursor")
+        after = decode_rank_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    ranked = top_scores(follow_graph.scores(get_jwt_identity()), limit + 1, after)
+
+    next_cursor = None
+    if len(ranked) > limit:
+        ranked = ranked[:limit]
+        next_cursor = encode_rank_cursor(*ranked[-1])
+
+    scores = {id: score for score, id in ranked}
+    closest_users = [
+        {"user": user, "score": scores[user["id"]]}
+        for user in serialize_user_profiles([id for _, id in ranked])
     ]
 
-    return jsonify(closest_users_json), 200
+    return paginated_response(closest_users, next_cursor), 200
 
 
 # GET /users/me
@@ -176,7 +205,6 @@ def get_user() -> tuple[Response, int]:
     query = User.query.filter_by(id=get_jwt_identity())
     user = query.first()
     has_posted_today = False
-    user_likes = 0
     outfits = user.outfits
 
     if user is None:
@@ -195,20 +223,16 @@ def get_user() -> tuple[Response, int]:
         if last_outfit.created_at.date() == datetime.now().date():
             has_posted_today = True
 
-    sorted_outfits = sorted(outfits, key=lambda outfit: outfit.created_at, reverse=True)
-    user.outfits = sorted_outfits
-
-    for outfit in outfits:
-        user_likes += len(outfit.likes)
+    fields = get_fields()
+    user_dict = serialize_users([user], fields)[0]
 
-    user_dict = user.to_dict()
     extended_user_data = {
         **user_dict,
-        "likes": user_likes,
+        "likes": user.like_count,
         "has_posted_today": has_posted_today,
     }
 
-    return jsonify(extended_user_data), 200
+    return jsonify(select_fields(extended_user_data, fields)), 200
 
 
 # GET /users/:id
@@ -217,7 +241,6 @@ def get_user() -> tuple[Response, int]:
 def get_user_by_id(id: str) -> tuple[Response, int]:
     user = User.query.filter_by(id=id).first()
     has_posted_today = False
-    user_likes = 0
     outfits = user.outfits
 
     if user is None:
@@ -236,20 +259,79 @@ def get_user_by_id(id: str) -> tuple[Response, int]:
         if last_outfit.created_at.date() == datetime.now().date():
             has_posted_today = True
 
-    sorted_outfits = sorted(outfits, key=lambda outfit: outfit.created_at, reverse=True)
-    user.outfits = sorted_outfits
-
-    for outfit in outfits:
-        user_likes += len(outfit.likes)
-
-    user_dict = user.to_dict()
     extended_user_data = {
-        **user_dict,
-        "likes": user_likes,
+        **cached("user", user.id, lambda: serialize_users([user])[0]),
+        "likes": user.like_count,
         "has_posted_today": has_posted_today,
     }
 
-    return jsonify(extended_user_data), 200
+    return jsonify(select_fields(extended_user_data, get_fields())), 200
+
+
+def _follow_page(user_id_column, key_column, id: str) -> tuple[Response, int]:
+    if User.query.filter_by(id=id).first() is None:
+        return jsonify({"message": "User not found"}), 404
+
+    query = Follow.query.filter(key_column == id, Follow.status == "Accepted")
+
+    try:
+        follows, next_cursor = paginate(query, Follow.created_at, Follow.id)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    users = serialize_user_profiles(
+        [getattr(follow, user_id_column.key) for follow in follows]
+    )
+
+    return paginated_response(users, next_cursor), 200
+
+
+# GET /users/:id/followers
+@users_bp.route("/<id>/followers", methods=["GET"])
+@jwt_required()
+def get_followers(id: str) -> tuple[Response, int]:
+    return _follow_page(Follow.follower_id, Follow.followee_id, id)
+
+
+# GET /users/:id/following
+@users_bp.route("/<id>/following", methods=["GET"])
+@jwt_required()
+def get_following(id: str) -> tuple[Response, int]:
+    return _follow_page(Follow.followee_id, Follow.follower_id, id)
+
+
+def _engagement_page(table, id: str) -> tuple[Response, int]:
+    if User.query.filter_by(id=id).first() is None:
+        return jsonify({"message": "User not found"}), 404
+
+    # Engagements carry no timestamp, so pages follow the outfits' own order.
+    query = Outfit.query.join(table, table.c.outfit_id == Outfit.id).filter(
+        table.c.user_id == id
+    )
+
+    try:
+        outfits, next_cursor = paginate(query, Outfit.created_at, Outfit.id)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    return (
+        paginated_response(serialize_outfits(outfits, get_fields()), next_cursor),
+        200,
+    )
+
+
+# GET /users/:id/liked-outfits
+@users_bp.route("/<id>/liked-outfits", methods=["GET"])
+@jwt_required()
+def get_liked_outfits(id: str) -> tuple[Response, int]:
+    return _engagement_page(outfit_like, id)
+
+
+# GET /users/:id/saved-outfits
+@users_bp.route("/<id>/saved-outfits", methods=["GET"])
+@jwt_required()
+def get_saved_outfits(id: str) -> tuple[Response, int]:
+    return _engagement_page(outfit_save, id)
 
 
 # GET /users/following-outfits
@@ -258,17 +340,23 @@ def get_user_by_id(id: str) -> tuple[Response, int]:
 def get_following_outfits():
     query = User.query.filter_by(id=get_jwt_identity())
     user = query.first()
-    following = user.following
-
-    outfits = []
-
-    for follow in following:
-        outfits.extend(follow.outfits)
 
     if user is None:
         return jsonify({"message": "User not found"}), 404
 
-    return jsonify([outfit.to_dict() for outfit in outfits]), 200
+    try:
+        entries, next_cursor = paginate(
+            timeline_query(user.id), TimelineEntry.created_at, TimelineEntry.outfit_id
+        )
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    outfits = hydrate_timeline(entries)
+
+    return (
+        paginated_response(serialize_outfits(outfits, get_fields()), next_cursor),
+        200,
+    )
 
 
 # GET /users/search/:query
@@ -280,7 +368,12 @@ def search_users_route(query: str) -> tuple[Response, int]:
     if users is None:
         return jsonify({"message": "No users found"}), 404
 
-    result = search_users([user.to_dict() for user in users], query)
+    fields = get_fields()
+    # Ranking reads the username and sign-up date of every user.
+    ranked_fields = fields and {**fields, "username": None, "created_at": None}
+    result = select_fields(
+        search_users(serialize_users(users, ranked_fields), query), fields
+    )
 
     if len(result) == 0:
         return jsonify({"message": "No users found"}), 200
@@ -350,11 +443,7 @@ def read_notifications() -> tuple[Response, int]:
     if user is None:
         return jsonify({"message": "User not found"}), 404
 
-    notifications = Notification.query.filter_by(user_id=user.id, is_read=False).all()
-
-    for notification in notifications:
-        notification.is_read = True
-
+    mark_all_read(user.id)
     db.session.commit()
 
     return jsonify({"message": "Notifications read successfully"}), 200
@@ -378,10 +467,10 @@ def read_notification() -> tuple[Response, int]:
     if user is None:
         return jsonify({"message": "User not found"}), 404
 
-    if notification is None:
+    if notification is None or notification.user_id != user.id:
         return jsonify({"message": "Notification not found"}), 404
 
-    notification.is_read = True
+    mark_read(notification)
 
     db.session.commit()
 
@@ -406,17 +495,63 @@ def update_basic_settings() -> tuple[Response, int]:
         return jsonify({"message": "User not found"}), 404
 
     if data["photo_base64"]:
-        user.image_url = upload_to_s3(data["photo_base64"], user.id, "profile_picture")
+        try:
+            variants = upload_image(
+                BytesIO(b64decode(data["photo_base64"])), "profile_picture"
+            )
+        except (OSError, ValueError):
+            return jsonify({"message": "Unknown image format"}), 400
+        except Exception as e:
+            return jsonify({"message": f"Error uploading file to S3: {e}"}), 400
+
+        user.image_url = variants["full"]
+        user.image_variants = variants
 
     user.bio = data["bio"]
     user.name = data["name"]
     user.is_private = data["is_private"]
 
+    invalidate("user", user.id)
     db.session.commit()
 
     return jsonify({"message": "User updated successfully"}), 200
 
 
+# PUT /users/me/image
+@users_bp.route("/me/image", methods=["PUT"])
+@jwt_required()
+def update_profile_picture() -> tuple[Response, int]:
+    user = User.query.filter_by(id=get_jwt_identity()).first()
+
+    if user is None:
+        return jsonify({"message": "User not found"}), 404
+
+    try:
+        first_chunk, stream = open_upload()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    with spool_upload(first_chunk, stream) as upload:
+        try:
+            variants = upload_image(upload, "profile_picture")
+        except (OSError, ValueError):
+            return jsonify({"message": "Unknown image format"}), 400
+        except Exception as e:
+            return jsonify({"message": f"Error uploading file to S3: {e}"}), 400
+
+    user.image_url = variants["full"]
+    user.image_variants = variants
+    user.updated_at = datetime.now()
+
+    invalidate("user", user.id)
+    db.session.commit()
+
+    return (
+        jsonify({"image_url": user.image_url, "image_variants": user.image_variants}),
+        200,
+    )
+
+
 # PUT /users/me
 @users_bp.route("/me", methods=["PUT"])
 @jwt_required()
@@ -441,18 +576,32 @@ def update_user() -> tuple[Response, int]:
         return jsonify({"message": "User not found"}), 404
 
     if data["photo_base64"]:
-        user.image_url = upload_to_s3(data["photo_base64"], user.id, "profile_picture")
+        try:
+            variants = upload_image(
+                BytesIO(b64decode(data["photo_base64"])), "profile_picture"
+            )
+        except (OSError, ValueError):
+            return jsonify({"message": "Unknown image format"}), 400
+        except Exception as e:
+            return jsonify({"message": f"Error uploading file to S3: {e}"}), 400
+
+        user.image_url = variants["full"]
+        user.image_variants = variants
 
         data.pop("photo_base64")
 
     data["updated_at"] = datetime.now()
 
+    if data["username"] != user.username:
+        reindex_username(user.id, data["username"])
+
     for key, value in data.items():
         setattr(user, key, value)
 
+    invalidate("user", user.id)
     db.session.commit()
 
-    return jsonify(user.to_dict()), 200
+    return jsonify(serialize_users([user])[0]), 200
 
 
 # PUT /users/follow
@@ -498,24 +647,18 @@ def follow_user() -> tuple[Response, int]:
         status=status,
     )
     db.session.add(new_follow)
+    backfill_timeline(user.id, user_to_follow.id)
 
-    new_notification = Notification(
-        id=str(uuid.uuid4()),
-        user_id=user_to_follow.id,
-        action_type="Follow",
-        entity_id=user.id,
-        sender_id=user.id,
-        entity_type="User",
-    )
-    send_push_notification(
+    add_notification(user_to_follow.id, "Follow", user.id, "User", user.id)
+    enqueue_push_notification(
         user_to_follow.expo_push_token,
         "New follower",
         f"{user.username} is now following you!",
     )
 
-    db.session.add(new_notification)
-
+    invalidate("user", user.id, user_to_follow.id)
     db.session.commit()
+    follow_graph.follow(user.id, user_to_follow.id)
 
     return (
         jsonify(
@@ -560,16 +703,11 @@ def accept_follow() -> tuple[Response, int]:
         return jsonify({"message": "You are already following this user"}), 400
 
     existing_follow.status = "Accepted"
+    existing_follow.updated_at = datetime.utcnow()
+    backfill_timeline(follower.id, user.id)
 
-    new_notification = Notification(
-        id=str(uuid.uuid4()),
-        sender_id=user.id,
-        user_id=follower.id,
-        action_type="Follow_Accepted",
-        entity_id=user.id,
-        entity_type="Follow",
-    )
-    send_push_notification(
+    add_notification(follower.id, "Follow_Accepted", user.id, "Follow", user.id)
+    enqueue_push_notification(
         follower.expo_push_token,
         "Follow request accepted",
         f"{user.username} has accepted your follow request!",
@@ -584,11 +722,11 @@ def accept_follow() -> tuple[Response, int]:
     ).first()
 
     if notification_to_delete:
-        db.session.delete(notification_to_delete)
-
-    db.session.add(new_notification)
+        delete_notification(notification_to_delete)
 
+    invalidate("user", user.id, follower.id)
     db.session.commit()
+    follow_graph.follow(follower.id, user.id)
 
     return (
         jsonify(
@@ -635,8 +773,9 @@ def reject_follow_request() -> tuple[Response, int]:
     ).first()
 
     if notification_to_delete:
-        db.session.delete(notification_to_delete)
+        delete_notification(notification_to_delete)
 
+    invalidate("user", current_user_id, user_to_unfollow_id)
     db.session.commit()
 
     return jsonify({"message": "Successfully rejected the follow request"}), 200
@@ -682,17 +821,20 @@ def unfollow_user() -> tuple[Response, int]:
     ).first()
 
     if notification_to_delete:
-        db.session.delete(notification_to_delete)
+        delete_notification(notification_to_delete)
 
     db.session.delete(follow_to_delete)
+    remove_author_from_timeline(user.id, user_to_unfollow.id)
 
+    invalidate("user", user.id, user_to_unfollow.id)
     db.session.commit()
+    follow_graph.unfollow(user.id, user_to_unfollow.id)
 
     return (
         jsonify(
             {
                 "message": "Successfully unfollowed user",
-                "user": user_to_unfollow.to_dict(),
+                "user": serialize_users([user_to_unfollow])[0],
             }
         ),
         201,
@@ -773,7 +915,8 @@ def google_callback() -> tuple[Response, int]:
 
     url = f"https://oauth2.googleapis.com/token?code=${auth_code}&client_id=${clientId}&client_secret=${clientSecret}&redirect_uri=http://localhost:3001/google&grant_type=authorization_code"
 
-    response = requests.post(url)
+    with timed("google"):
+        response = requests.post(url)
     print(response.json())
 
     return jsonify({"message": "Google callback"}), 200
@@ -850,7 +993,8 @@ def refresh_token() -> tuple[Response, int]:
 @jwt_required()
 def logout() -> tuple[Response, int]:
     jti = get_jwt()["jti"]
-    token = TokenBlockList(jti=jti, created_at=datetime.now())
+    token = TokenBlockList(id=str(uuid.uuid4()), jti=jti, created_at=datetime.now())
     db.session.add(token)
     db.session.commit()
+    blocklist.add(jti)
     return jsonify({"message": "Successfully logged out"}), 200
@@ -0,0 +1,333 @@
+from base64 import b64encode
+from datetime import datetime
+from io import BytesIO
+from itertools import accumulate
+from PIL import Image
+from flask_jwt_extended import create_access_token
+from sqlalchemy import column, func, select, table, text
+from core.query_budget import QueryRecorder
+from core.synthetic import HASHTAGS, WORDS, ZIPF
+from db import db
+from models import Notification, Outfit, User
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+
+PERCENTILES = (50, 95, 99)
+JOIN_REPEATS = 5
+
+# Tables written to on every like, follow or post, whose size is dominated by
+# their keys.
+STORAGE_TABLES = (
+    "user",
+    "outfit",
+    "follow",
+    "outfit_like",
+    "outfit_save",
+    "comment",
+    "comment_like",
+    "notification",
+    "timeline_entry",
+)
+
+
+def _table(name: str, *columns: str):
+    # Untyped, so the joins below run the same against any key type.
+    return table(name, *(column(name) for name in columns))
+
+
+_user = _table("user", "id")
+_outfit = _table("outfit", "id", "user_id")
+_outfit_like = _table("outfit_like", "outfit_id", "user_id")
+_follow = _table("follow", "follower_id", "followee_id")
+_timeline_entry = _table("timeline_entry", "user_id", "author_id")
+_comment = _table("comment", "id", "outfit_id")
+_comment_like = _table("comment_like", "comment_id", "user_id")
+
+# name: FROM clause counted in full, every join is on key columns.
+JOINS = {
+    "likes_to_authors": _outfit_like.join(
+        _outfit, _outfit.c.id == _outfit_like.c.outfit_id
+    ).join(_user, _user.c.id == _outfit.c.user_id),
+    "timelines_to_follows": _timeline_entry.join(
+        _follow,
+        (_follow.c.follower_id == _timeline_entry.c.user_id)
+        & (_follow.c.followee_id == _timeline_entry.c.author_id),
+    ),
+    "comment_likes_to_outfits": _comment_like.join(
+        _comment, _comment.c.id == _comment_like.c.comment_id
+    ).join(_outfit, _outfit.c.id == _comment.c.outfit_id),
+}
+
+
+def _png() -> str:
+    buffer = BytesIO()
+    Image.new("RGB", (64, 64), (200, 80, 80)).save(buffer, "PNG")
+
+    return b64encode(buffer.getvalue()).decode()
+
+
+# name: (method, path template, body builder). Templates are filled with a
+# random (Zipf weighted) caller and profile owner for every request.
+SCENARIOS = {
+    "feed": ("GET", "/outfits/?limit=20", None),
+    "timeline": ("GET", "/users/following-outfits?limit=20", None),
+    "search": ("GET", "/outfits/search/{word}?limit=20", None),
+    "hashtag": ("GET", "/outfits/hashtags/{hashtag}?limit=20", None),
+    "profile": ("GET", "/users/{user_id}", None),
+    "me": ("GET", "/users/me", None),
+    "notifications": ("GET", "/users/unread-notifications?limit=20", None),
+    "upload": (
+        "POST",
+        "/outfits/upload",
+        lambda rng, png: {
+            "video_url": None,
+            "description": " ".join(rng.sample(WORDS, 4)),
+            "style": "casual",
+            "hashtags": rng.sample(HASHTAGS, 2),
+            "outfit_links": [],
+            "outfit_images": [png],
+        },
+    ),
+}
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+
+    index = min(len(sorted_values) - 1, round(p / 100 * (len(sorted_values) - 1)))
+
+    return sorted_values[index]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def dataset_size() -> dict:
+    return {
+        model.__tablename__: db.session.query(func.count()).select_from(model).scalar()
+        for model in (User, Outfit, Notification)
+    }
+
+
+def storage_sizes() -> dict:
+    """Rows and on-disk bytes of the tables and of their indexes, for
+    STORAGE_TABLES."""
+    dialect = db.engine.dialect.name
+    sizes = {}
+
+    for name in STORAGE_TABLES:
+        rows = db.session.execute(
+            select(func.count()).select_from(table(name))
+        ).scalar()
+
+        if dialect == "postgresql":
+            table_bytes, index_bytes = db.session.execute(
+                text(
+                    "SELECT pg_table_size(CAST(:name AS regclass)), "
+                    "pg_indexes_size(CAST(:name AS regclass))"
+                ),
+                {"name": f'"{name}"'},
+            ).one()
+        elif dialect == "sqlite":
+            # Needs SQLite built with the dbstat table, as the Python
+            # builds are.
+            table_bytes, index_bytes = db.session.execute(
+                text(
+                    "SELECT coalesce(sum(CASE WHEN s.name = :name "
+                    "THEN s.pgsize END), 0), "
+                    "coalesce(sum(CASE WHEN s.name != :name "
+                    "THEN s.pgsize END), 0) "
+                    "FROM dbstat s JOIN sqlite_master m ON m.name = s.name "
+                    "WHERE m.tbl_name = :name"
+                ),
+                {"name": name},
+            ).one()
+        else:
+            table_bytes, index_bytes = db.session.execute(
+                text(
+                    "SELECT data_length, index_length FROM information_schema.tables "
+                    "WHERE table_schema = DATABASE() AND table_name = :name"
+                ),
+                {"name": name},
+            ).one()
+
+        sizes[name] = {
+            "rows": rows,
+            "table_kb": round(table_bytes / 1024),
+            "index_kb": round(index_bytes / 1024),
+        }
+
+    return sizes
+
+
+def time_joins(repeats: int = JOIN_REPEATS) -> dict:
+    """Median milliseconds of counting each of JOINS, warm cache."""
+    timings = {}
+
+    for name, joined in JOINS.items():
+        statement = select(func.count()).select_from(joined)
+        db.session.execute(statement).scalar()
+        durations = []
+
+        for _ in range(repeats):
+            started_at = time.perf_counter()
+            db.session.execute(statement).scalar()
+            durations.append((time.perf_counter() - started_at) * 1000)
+
+        timings[name] = round(percentile(sorted(durations), 50), 3)
+
+    return timings
+
+
+def run_benchmark(
+    app, requests: int = 200, scenarios: list | None = None, seed: int = 1
+) -> dict:
+    """Replay ``requests`` requests per scenario through ``app`` and return
+    latency percentiles (ms), throughput and statement counts per scenario.
+
+    Callers and profiles are drawn from the users ordered by likes received
+    with Zipf weights, so popular accounts get most of the traffic as they
+    do in production.
+    """
+    rng = random.Random(seed)
+    user_ids = [
+        user_id
+        for (user_id,) in db.session.query(User.id).order_by(
+            User.like_count.desc(), User.id
+        )
+    ]
+
+    if not user_ids:
+        raise ValueError("The database is empty, seed it first")
+
+    weights = list(accumulate(1 / (rank + 1) ** ZIPF for rank in range(len(user_ids))))
+    tokens = {}
+    png = _png()
+    client = app.test_client()
+    results = {}
+
+    def headers(user_id: str) -> dict:
+        if user_id not in tokens:
+            tokens[user_id] = create_access_token(identity=user_id)
+
+        return {"Authorization": f"Bearer {tokens[user_id]}"}
+
+    # Measured before any request, uploads add rows to the dataset.
+    dataset = dataset_size()
+    storage = storage_sizes()
+    joins = time_joins()
+
+    # Scenarios that write run after the reads, so every read is measured
+    # against the dataset as seeded.
+    for name in sorted(
+        scenarios or SCENARIOS, key=lambda name: SCENARIOS[name][0] != "GET"
+    ):
+        method, template, body = SCENARIOS[name]
+        latencies = []
+        statements = []
+        errors = 0
+        started_at = time.perf_counter()
+
+        for _ in range(requests):
+            caller, owner = rng.choices(user_ids, cum_weights=weights, k=2)
+            path = template.format(
+                user_id=owner,
+                word=rng.choice(WORDS),
+                hashtag=rng.choice(HASHTAGS).lstrip("#"),
+            )
+            json = body(rng, png) if body else None
+
+            with QueryRecorder() as recorder:
+                request_started_at = time.perf_counter()
+                response = client.open(
+                    path, method=method, json=json, headers=headers(caller)
+                )
+                latencies.append((time.perf_counter() - request_started_at) * 1000)
+
+            statements.append(recorder.count)
+
+            if response.status_code >= 500:
+                errors += 1
+
+        elapsed = time.perf_counter() - started_at
+        latencies.sort()
+
+        results[name] = {
+            "requests": requests,
+            "errors": errors,
+            "throughput_rps": round(requests / elapsed, 2),
+            **{f"p{p}_ms": round(percentile(latencies, p), 3) for p in PERCENTILES},
+            "max_ms": round(latencies[-1], 3),
+            "queries_mean": round(sum(statements) / len(statements), 2),
+            "queries_max": max(statements),
+        }
+
+    return {
+        "commit": _commit(),
+        "created_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "database": db.engine.dialect.name,
+        "dataset": dataset,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "storage": storage,
+        "joins_ms": joins,
+        "scenarios": results,
+    }
+
+
+def compare_results(baseline: dict, current: dict) -> list:
+    """One line per scenario with the relative change of p50/p95/p99 and of
+    the mean statement count against ``baseline``, then one per table size
+    and join timing."""
+    lines = []
+
+    for name, now in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+
+        if before is None:
+            lines.append(f"{name}: new")
+            continue
+
+        changes = []
+        for key in [f"p{p}_ms" for p in PERCENTILES] + ["queries_mean"]:
+            if before[key]:
+                change = (now[key] - before[key]) / before[key] * 100
+                changes.append(f"{key} {before[key]} -> {now[key]} ({change:+.0f}%)")
+
+        lines.append(f"{name}: " + ", ".join(changes))
+
+    for name, now in current.get("storage", {}).items():
+        before = baseline.get("storage", {}).get(name)
+
+        if before is not None:
+            lines.append(
+                f"{name} storage: table {before['table_kb']} -> {now['table_kb']} kB, "
+                f"indexes {before['index_kb']} -> {now['index_kb']} kB"
+            )
+
+    for name, now in current.get("joins_ms", {}).items():
+        before = baseline.get("joins_ms", {}).get(name)
+
+        if before:
+            change = (now - before) / before * 100
+            lines.append(f"{name} join: {before} -> {now} ms ({change:+.0f}%)")
+
+    return lines
@@ -0,0 +1,176 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app
+from db import db
+from models import TokenBlockList
+import hashlib
+import math
+import threading
+import time
+
+# Revoked tokens are picked up from the table at most this many seconds after
+# another process revoked them.
+REFRESH_INTERVAL = 2
+# Rows are fetched from a little before the previous refresh so a logout whose
+# transaction committed late is not missed.
+REFRESH_OVERLAP = timedelta(seconds=30)
+# The filter cannot forget revoked tokens, so it is rebuilt from the (purged)
+# table every so often.
+REBUILD_INTERVAL = 15 * 60
+
+BLOOM_CAPACITY = 100_000
+BLOOM_ERROR_RATE = 0.01
+LRU_SIZE = 1024
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, value: str) -> None:
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+
+class TokenBlocklist:
+    """In-process view of TokenBlockList.
+
+    Every JTI in the table is in the Bloom filter, so a token that is not in
+    the filter is definitely not revoked and needs no query. Possible hits are
+    confirmed against the table and remembered in a small LRU.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.filter = None
+        self.revoked = OrderedDict()
+        # JTIs revoked while a refresh queries the table, added to its result
+        # in case the query did not see them.
+        self.pending = None
+        self.refreshed_at = None
+        self.next_refresh = 0
+        self.next_rebuild = 0
+
+    def _refresh(self) -> None:
+        """Query the table without holding the lock and add the JTIs under it.
+        A rebuild fills a new filter that replaces the current one."""
+        rebuild = self.filter is None or time.monotonic() >= self.next_rebuild
+        started_at = datetime.now()
+        query = db.session.query(TokenBlockList.jti)
+
+        if not rebuild:
+            query = query.filter(
+                TokenBlockList.created_at >= self.refreshed_at - REFRESH_OVERLAP
+            )
+
+        with self.lock:
+            self.pending = []
+
+        jtis = [jti for (jti,) in query.all()]
+
+        if rebuild:
+            bloom = BloomFilter(BLOOM_CAPACITY, BLOOM_ERROR_RATE)
+
+            for jti in jtis:
+                bloom.add(jti)
+
+            jtis = []
+
+        with self.lock:
+            if rebuild:
+                self.filter = bloom
+                self.revoked.clear()
+                self.next_rebuild = time.monotonic() + REBUILD_INTERVAL
+
+            for jti in jtis:
+                self.filter.add(jti)
+
+            for jti in self.pending:
+                self.filter.add(jti)
+                self._remember(jti)
+
+            self.pending = None
+            self.refreshed_at = started_at
+            self.next_refresh = time.monotonic() + REFRESH_INTERVAL
+
+    def _remember(self, jti: str) -> None:
+        self.revoked[jti] = True
+        self.revoked.move_to_end(jti)
+
+        if len(self.revoked) > LRU_SIZE:
+            self.revoked.popitem(last=False)
+
+    def add(self, jti: str) -> None:
+        """Record a JTI that was just committed to the table."""
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append(jti)
+
+            if self.filter is not None:
+                self.filter.add(jti)
+
+            self._remember(jti)
+
+    def is_revoked(self, jti: str) -> bool:
+        # One request refreshes while the others keep using the current
+        # filter, only the very first load is waited for.
+        if time.monotonic() >= self.next_refresh and self.refresh_lock.acquire(
+            blocking=self.filter is None
+        ):
+            try:
+                if time.monotonic() >= self.next_refresh:
+                    self._refresh()
+            finally:
+                self.refresh_lock.release()
+
+        with self.lock:
+            if jti in self.revoked:
+                self.revoked.move_to_end(jti)
+                return True
+
+            if jti not in self.filter:
+                return False
+
+        revoked = (
+            db.session.query(TokenBlockList.id).filter_by(jti=jti).first() is not None
+        )
+
+        if revoked:
+            with self.lock:
+                self._remember(jti)
+
+        return revoked
+
+
+blocklist = TokenBlocklist()
+
+
+def purge_expired_tokens() -> int:
+    # Only access tokens are revoked, and an access token revoked at
+    # created_at was issued before it, so it has expired once
+    # JWT_ACCESS_TOKEN_EXPIRES has passed.
+    cutoff = datetime.now() - current_app.config["JWT_ACCESS_TOKEN_EXPIRES"]
+
+    purged = TokenBlockList.query.filter(TokenBlockList.created_at < cutoff).delete(
+        synchronize_session=False
+    )
+    db.session.commit()
+
+    return purged
@@ -0,0 +1,186 @@
+from collections import OrderedDict, defaultdict
+from flask import json
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from core.config import CACHE_BACKEND, CACHE_MAX_ENTRIES, CACHE_URL
+from db import db
+import threading
+import time
+
+# Bump whenever the shape of a cached payload changes, so entries written by
+# the previous release are never served by the new one.
+CACHE_VERSION = 1
+
+# Seconds an entry may live. Writes to the entity itself invalidate it right
+# away, the TTL bounds staleness from indirect changes (e.g. a liker renaming
+# themselves while their name is embedded in someone else's outfit).
+TTLS = {
+    "outfit": 120,
+    "user": 60,
+    "comment": 120,
+}
+
+
+class LRUCache:
+    """In-process cache, only coherent when the app runs as a single process."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+
+            return value
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, keys: list) -> None:
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+
+class RedisCache:
+    """Cache shared by every process, backed by anything that speaks the Redis
+    protocol (Redis, Valkey, KeyDB, a local stand-in...)."""
+
+    def __init__(self, url: str = CACHE_URL, client=None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(
+                url or "redis://localhost:6379/0",
+                socket_timeout=0.25,
+                socket_connect_timeout=0.25,
+            )
+
+        self.client = client
+
+    def get(self, key: str) -> str | None:
+        value = self.client.get(key)
+
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        self.client.set(key, value, ex=ttl)
+
+    def delete(self, keys: list) -> None:
+        if keys:
+            self.client.delete(*keys)
+
+
+_cache = None
+_stats = defaultdict(lambda: {"hits": 0, "misses": 0, "errors": 0})
+
+
+def get_cache():
+    global _cache
+
+    if _cache is None:
+        _cache = RedisCache() if CACHE_BACKEND == "redis" else LRUCache()
+
+    return _cache
+
+
+def set_cache(cache) -> None:
+    global _cache
+
+    _cache = cache
+
+
+def cache_key(kind: str, id: str) -> str:
+    return f"gotstyle:v{CACHE_VERSION}:{kind}:{id}"
+
+
+def cached(kind: str, id: str, build):
+    """Return the cached payload for ``kind``/``id``, building it on a miss.
+
+    A cache that is down is treated as a miss, so reads keep working and only
+    lose the speed-up.
+    """
+    if CACHE_BACKEND == "none":
+        return build()
+
+    key = cache_key(kind, id)
+    stats = _stats[kind]
+
+    try:
+        value = get_cache().get(key)
+    except Exception as e:
+        print(f"Cache read failed for {key}: {e}")
+        stats["errors"] += 1
+        value = None
+
+    if value is not None:
+        stats["hits"] += 1
+        return json.loads(value)
+
+    stats["misses"] += 1
+    value = json.dumps(build())
+
+    try:
+        get_cache().set(key, value, TTLS[kind])
+    except Exception as e:
+        print(f"Cache write failed for {key}: {e}")
+        stats["errors"] += 1
+
+    # Decode what was stored so hits and misses return identical payloads.
+    return json.loads(value)
+
+
+def invalidate(kind: str, *ids: str) -> None:
+    """Drop the cached payloads once the current transaction commits.
+
+    Deleting before the commit would let a concurrent read cache the old
+    rows again, so the keys are queued on the session instead.
+    """
+    pending = db.session.info.setdefault("cache_invalidations", set())
+    pending.update(cache_key(kind, id) for id in ids if id)
+
+
+def invalidate_outfit(outfit) -> None:
+    # The owner's profile embeds their outfits.
+    invalidate("outfit", outfit.id)
+    invalidate("user", outfit.user_id)
+
+
+def cache_stats() -> dict:
+    return {kind: dict(stats) for kind, stats in _stats.items()}
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_invalidations(session) -> None:
+    keys = session.info.pop("cache_invalidations", None)
+
+    if not keys or CACHE_BACKEND == "none":
+        return
+
+    try:
+        get_cache().delete(list(keys))
+    except Exception as e:
+        print(f"Cache invalidation failed: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session) -> None:
+    session.info.pop("cache_invalidations", None)
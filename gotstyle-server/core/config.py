@@ -1,5 +1,6 @@
 from dotenv import load_dotenv
 import os
+import tempfile
 
 load_dotenv()
 
@@ -7,4 +8,44 @@ AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY")
 AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY")
 BUCKET_NAME = os.getenv("BUCKET_NAME")
 CLOUDFRONT_DOMAIN = os.getenv("CLOUDFRONT_DOMAIN")
-CLOUDFRONT_DISTRIBUTION_ID = os.getenv("CLOUDFRONT_DISTRIBUTION_ID")
+
+EXPO_PUSH_URL = os.getenv("EXPO_PUSH_URL", "https://exp.host/--/api/v2/push/send")
+
+# Raw uploads wait here until the image worker has processed them, so it must
+# be shared between the web processes and the worker.
+UPLOAD_STAGING_DIR = os.getenv(
+    "UPLOAD_STAGING_DIR", os.path.join(tempfile.gettempdir(), "gotstyle-uploads")
+)
+
+# "s3" (default), "local" or "memory". The last two keep uploads off AWS for
+# development and benchmarks.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "s3")
+LOCAL_STORAGE_DIR = os.getenv(
+    "LOCAL_STORAGE_DIR", os.path.join(tempfile.gettempdir(), "gotstyle-storage")
+)
+LOCAL_STORAGE_URL = os.getenv("LOCAL_STORAGE_URL", "http://localhost:5000/media")
+
+# "redis" (shared, the default when CACHE_URL is set), "none" (the default
+# otherwise) or "memory" (per process). "memory" is only safe with a single web
+# process, since writes handled by one process cannot invalidate the others;
+# gunicorn_config.py refuses it with more than one worker.
+CACHE_URL = os.getenv("CACHE_URL")
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "redis" if CACHE_URL else "none")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+# Add a Server-Timing header (db, serialize, external calls) to every response
+# so browser dev tools can show where a request spent its time.
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"
+# Requests slower than this are logged with the fingerprints of their queries.
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "500"))
+# /metrics and /metrics/cache are only served when this is set, to requests
+# sending it as "Authorization: Bearer <token>".
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Outfit links are checked in parallel, with up to LINK_CHECK_CONCURRENCY
+# requests in flight per process and LINK_CHECK_PER_HOST against one shop.
+# An upload waits at most LINK_CHECK_TIMEOUT seconds for links it has not
+# seen before and rejects the ones that are still unanswered.
+LINK_CHECK_CONCURRENCY = int(os.getenv("LINK_CHECK_CONCURRENCY", "8"))
+LINK_CHECK_PER_HOST = int(os.getenv("LINK_CHECK_PER_HOST", "2"))
+LINK_CHECK_TIMEOUT = float(os.getenv("LINK_CHECK_TIMEOUT", "5"))
@@ -0,0 +1,119 @@
+from sqlalchemy import func, or_, select
+from db import db
+from models import Comment, Outfit, User, outfit_like, outfit_save
+
+COUNTERS = {
+    "outfit_like": "like_count",
+    "outfit_save": "save_count",
+}
+
+
+def adjust_counter(outfit: Outfit, field: str, delta: int) -> None:
+    for model, id in ((Outfit, outfit.id), (User, outfit.user_id)):
+        column = getattr(model, field)
+        db.session.query(model).filter_by(id=id).update({column: column + delta})
+
+
+def has_engagement(table, outfit_id: str, user_id: str) -> bool:
+    row = (
+        db.session.query(table.c.outfit_id)
+        .filter(table.c.outfit_id == outfit_id, table.c.user_id == user_id)
+        .first()
+    )
+
+    return row is not None
+
+
+def add_engagement(table, outfit: Outfit, user_id: str) -> bool:
+    if has_engagement(table, outfit.id, user_id):
+        return False
+
+    db.session.execute(table.insert().values(outfit_id=outfit.id, user_id=user_id))
+    adjust_counter(outfit, COUNTERS[table.name], 1)
+
+    return True
+
+
+def remove_engagement(table, outfit: Outfit, user_id: str) -> bool:
+    result = db.session.execute(
+        table.delete().where(table.c.outfit_id == outfit.id, table.c.user_id == user_id)
+    )
+
+    if result.rowcount == 0:
+        return False
+
+    adjust_counter(outfit, COUNTERS[table.name], -1)
+
+    return True
+
+
+def remove_outfit_counters(outfit: Outfit) -> None:
+    db.session.query(User).filter_by(id=outfit.user_id).update(
+        {
+            User.like_count: User.like_count - outfit.like_count,
+            User.save_count: User.save_count - outfit.save_count,
+            User.comment_count: User.comment_count - outfit.comment_count,
+        }
+    )
+
+
+def reconcile_counters() -> int:
+    """Recompute every counter from the source tables and repair drift.
+
+    Returns the number of outfit and user rows that had to be corrected.
+    """
+
+    def count(table_or_model, column):
+        return (
+            select(func.count())
+            .select_from(table_or_model)
+            .where(column == Outfit.id)
+            .scalar_subquery()
+        )
+
+    likes = count(outfit_like, outfit_like.c.outfit_id)
+    saves = count(outfit_save, outfit_save.c.outfit_id)
+    comments = count(Comment, Comment.outfit_id)
+
+    outfits = db.session.execute(
+        Outfit.__table__.update()
+        .where(
+            or_(
+                Outfit.like_count != likes,
+                Outfit.save_count != saves,
+                Outfit.comment_count != comments,
+            )
+        )
+        .values(like_count=likes, save_count=saves, comment_count=comments)
+    ).rowcount
+
+    def total(column):
+        return (
+            select(func.coalesce(func.sum(column), 0))
+            .where(Outfit.user_id == User.id)
+            .scalar_subquery()
+        )
+
+    like_total = total(Outfit.like_count)
+    save_total = total(Outfit.save_count)
+    comment_total = total(Outfit.comment_count)
+
+    users = db.session.execute(
+        User.__table__.update()
+        .where(
+            or_(
+                User.like_count != like_total,
+                User.save_count != save_total,
+                User.comment_count != comment_total,
+            )
+        )
+        .values(
+            like_count=like_total,
+            save_count=save_total,
+            comment_count=comment_total,
+        )
+    ).rowcount
+
+    db.session.commit()
+
+    return outfits + users
@@ -0,0 +1,65 @@
+from flask import request
+
+
+def parse_fields(value: str | None) -> dict | None:
+    """Parse a sparse fieldset such as ``id,username,outfits.id``.
+
+    Returns a tree mapping each requested field to the tree of its requested
+    subfields, or to None when the whole field is wanted. No fieldset (None)
+    means the full payload.
+    """
+    if not value:
+        return None
+
+    tree = {}
+
+    for path in value.split(","):
+        names = [name.strip() for name in path.split(".")]
+
+        if not all(names):
+            continue
+
+        node = tree
+        for name in names[:-1]:
+            child = node.get(name, {})
+
+            # The whole parent was already requested.
+            if child is None:
+                break
+
+            node[name] = child
+            node = child
+        else:
+            node[names[-1]] = None
+
+    return tree or None
+
+
+def get_fields() -> dict | None:
+    return parse_fields(request.args.get("fields"))
+
+
+def wants(fields: dict | None, name: str) -> bool:
+    return fields is None or name in fields
+
+
+def subfields(fields: dict | None, name: str) -> dict | None:
+    return None if fields is None else fields.get(name)
+
+
+def select_fields(value, fields: dict | None):
+    """Trim a serialized payload (or a list of them) down to ``fields``."""
+    if fields is None:
+        return value
+
+    if isinstance(value, list):
+        return [select_fields(item, fields) for item in value]
+
+    if not isinstance(value, dict):
+        return value
+
+    return {
+        name: select_fields(value[name], child)
+        for name, child in fields.items()
+        if name in value
+    }
@@ -0,0 +1,96 @@
+from collections import Counter
+from datetime import date, datetime, timedelta
+from sqlalchemy import case, func, update
+from db import db, insert_all, upsert
+from models import HashtagDailyCount, OutfitHashtag
+import uuid
+
+
+def normalize_hashtag(hashtag: str) -> str:
+    return hashtag.strip().lstrip("#").strip().lower()
+
+
+def _bump_daily_counts(day: date, hashtags: list, delta: int) -> None:
+    counts = Counter(normalize_hashtag(hashtag) for hashtag in hashtags)
+    counts.pop("", None)
+
+    if not counts:
+        return
+
+    # Single statements, concurrent uploads of the same trending tag must
+    # neither lose increments nor race to create the day's row.
+    if delta > 0:
+        upsert(
+            HashtagDailyCount.__table__,
+            [
+                {"day": day, "hashtag": hashtag, "count": count * delta}
+                for hashtag, count in sorted(counts.items())
+            ],
+            ["day", "hashtag"],
+            lambda proposed: {"count": HashtagDailyCount.count + proposed.count},
+        )
+        return
+
+    for hashtag, count in sorted(counts.items()):
+        decrement = -count * delta
+        db.session.execute(
+            update(HashtagDailyCount)
+            .where(HashtagDailyCount.day == day, HashtagDailyCount.hashtag == hashtag)
+            .values(
+                count=case(
+                    (HashtagDailyCount.count < decrement, 0),
+                    else_=HashtagDailyCount.count - decrement,
+                )
+            )
+        )
+
+
+def add_outfit_hashtags(outfit, hashtags: list) -> list:
+    outfit_hashtags = [
+        OutfitHashtag(
+            id=str(uuid.uuid4()),
+            outfit_id=outfit.id,
+            hashtag=hashtag,
+            normalized=normalize_hashtag(hashtag),
+        )
+        for hashtag in hashtags
+    ]
+    insert_all(outfit_hashtags)
+
+    _bump_daily_counts(outfit.created_at.date(), hashtags, 1)
+
+    return outfit_hashtags
+
+
+def remove_outfit_hashtags(outfit) -> None:
+    hashtags = [
+        hashtag
+        for (hashtag,) in db.session.query(OutfitHashtag.hashtag).filter_by(
+            outfit_id=outfit.id
+        )
+    ]
+
+    if not hashtags:
+        return
+
+    if outfit.created_at is not None:
+        _bump_daily_counts(outfit.created_at.date(), hashtags, -1)
+
+    OutfitHashtag.query.filter_by(outfit_id=outfit.id).delete()
+
+
+def trending_hashtags(days: int, limit: int) -> list:
+    since = (datetime.utcnow() - timedelta(days=days)).date()
+    total = func.sum(HashtagDailyCount.count)
+
+    rows = (
+        db.session.query(HashtagDailyCount.hashtag, total)
+        .filter(HashtagDailyCount.day > since)
+        .group_by(HashtagDailyCount.hashtag)
+        .having(total > 0)
+        .order_by(total.desc(), HashtagDailyCount.hashtag)
+        .limit(limit)
+        .all()
+    )
+
+    return [{"hashtag": hashtag, "count": count} for hashtag, count in rows]
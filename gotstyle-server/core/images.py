@@ -0,0 +1,152 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from core.cache import invalidate_outfit
+from core.config import UPLOAD_STAGING_DIR
+from core.s3 import check_dimensions, process_image, put_variants
+from core.uploads import write_upload
+from db import db
+from models import OutfitImage
+import os
+import time
+import uuid
+
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 30
+
+
+def staged_path(image_id: str) -> str:
+    return os.path.join(UPLOAD_STAGING_DIR, image_id)
+
+
+def stage_image(image_data: bytes, outfit_id: str) -> OutfitImage:
+    os.makedirs(UPLOAD_STAGING_DIR, exist_ok=True)
+
+    image = OutfitImage(
+        id=str(uuid.uuid4()), outfit_id=outfit_id, image_url=None, status="Pending"
+    )
+
+    with open(staged_path(image.id), "wb") as f:
+        f.write(image_data)
+
+    return image
+
+
+def stage_upload(first_chunk: bytes, stream, outfit_id: str) -> OutfitImage:
+    """Stage a streamed upload, raising ValueError (and dropping the file)
+    when it is not an image the worker can render."""
+    os.makedirs(UPLOAD_STAGING_DIR, exist_ok=True)
+
+    image = OutfitImage(
+        id=str(uuid.uuid4()), outfit_id=outfit_id, image_url=None, status="Pending"
+    )
+
+    with open(staged_path(image.id), "w+b") as f:
+        write_upload(first_chunk, stream, f)
+        f.seek(0)
+
+        try:
+            check_dimensions(f)
+        except ValueError:
+            os.remove(staged_path(image.id))
+            raise
+
+    return image
+
+
+def process_staged_image(image_id: str, img_type: str) -> tuple[str, dict]:
+    with open(staged_path(image_id), "rb") as f:
+        return process_image(f, img_type)
+
+
+def _retry_later(image: OutfitImage, error: str) -> None:
+    image.attempts += 1
+
+    if image.attempts >= MAX_ATTEMPTS:
+        print(f"Giving up on image {image.id}: {error}")
+        image.status = "Failed"
+        return
+
+    print(f"Error uploading image {image.id}, will retry: {error}")
+    delay = BACKOFF_SECONDS * 2 ** (image.attempts - 1)
+    image.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+
+
+def process_pending_images(executor: ProcessPoolExecutor, limit: int = 50) -> int:
+    """Render and upload up to ``limit`` due Pending images.
+
+    Returns the number of images that were attempted.
+    """
+    query = OutfitImage.query.filter(
+        OutfitImage.status == "Pending",
+        or_(
+            OutfitImage.next_attempt_at.is_(None),
+            OutfitImage.next_attempt_at <= datetime.utcnow(),
+        ),
+    ).order_by(OutfitImage.next_attempt_at)
+
+    # Claimed until the commit below, so several workers share the queue.
+    if db.engine.dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+
+    images = query.limit(limit).all()
+
+    futures = {
+        executor.submit(process_staged_image, image.id, "outfit_image"): image
+        for image in images
+    }
+
+    finished = []
+    for future in as_completed(futures):
+        image = futures[future]
+
+        try:
+            digest, variants = future.result()
+        except BrokenProcessPool as e:
+            # A render took down a pool process (out of memory, a crash in a
+            # decoder), none of the batch is at fault for sure.
+            _retry_later(image, str(e))
+            continue
+        except Exception as e:
+            # Anything else the image itself causes (truncated data, a
+            # decompression bomb...) fails the same way on every attempt.
+            print(f"Could not process image {image.id}: {e}")
+            image.status = "Failed"
+        else:
+            try:
+                urls = put_variants(digest, variants, "outfit_image")
+            except Exception as e:
+                _retry_later(image, str(e))
+                continue
+
+            image.image_url = urls["full"]
+            image.variants = urls
+            image.status = "Ready"
+
+        invalidate_outfit(image.outfit)
+        finished.append(image.id)
+
+    db.session.commit()
+
+    for image_id in finished:
+        try:
+            os.remove(staged_path(image_id))
+        except FileNotFoundError:
+            pass
+
+    return len(images)
+
+
+def run_image_worker(poll_interval: float = 1.0, workers: int | None = None) -> None:
+    workers = workers or os.cpu_count()
+
+    while True:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            try:
+                while True:
+                    if process_pending_images(executor, limit=4 * workers) == 0:
+                        time.sleep(poll_interval)
+            except BrokenProcessPool as e:
+                print(f"Image worker pool broke, starting a new one: {e}")
+                db.session.rollback()
@@ -0,0 +1,234 @@
+from collections import Counter, defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from flask import json
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit, urlunsplit
+from core.cache import LRUCache, get_cache
+from core.config import (
+    CACHE_BACKEND,
+    LINK_CHECK_CONCURRENCY,
+    LINK_CHECK_PER_HOST,
+    LINK_CHECK_TIMEOUT,
+)
+from core.metrics import timed
+import hashlib
+import logging
+import requests
+import threading
+import time
+
+# Seconds a check result is used as is. Dead links are checked again sooner,
+# the shop may only have been down for a moment.
+LINK_TTL = 24 * 60 * 60
+LINK_NEGATIVE_TTL = 10 * 60
+# After that the result is still used for this long while a background check
+# refreshes it, so popular links never wait on the shop again.
+LINK_STALE_TTL = 7 * 24 * 60 * 60
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# Answers to HEAD from shops that only serve GET, checked again with a GET.
+HEAD_UNSUPPORTED = {403, 405, 501}
+
+# Checks run on pool threads, outside any app context.
+logger = logging.getLogger(__name__)
+
+
+def normalize_url(url: str) -> str:
+    """The URL with its scheme and host lowercased, default port, fragment
+    and surrounding whitespace dropped, so spellings of the same link share
+    one cache entry."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+
+    if ":" in host:
+        host = f"[{host}]"
+
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+
+    if parts.username or parts.password:
+        host = f"{parts.netloc.rsplit('@', 1)[0]}@{host}"
+
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+
+def _cache_key(url: str) -> str:
+    digest = hashlib.sha1(url.encode()).hexdigest()
+
+    return f"gotstyle:link:{digest}"
+
+
+class LinkValidator:
+    """Check that outfit links resolve, remembering the answers.
+
+    Results are kept in the shared cache (see core.cache), or in a per
+    process one without it, for LINK_TTL, or LINK_NEGATIVE_TTL for dead links,
+    and served stale while a background check refreshes them. Checks run on a
+    shared thread pool with a keep-alive connection pool per host. At most
+    ``per_host`` checks against one host are handed to the pool at a time, the
+    others wait in a queue of that host so they never hold a pool thread.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = LINK_CHECK_CONCURRENCY,
+        per_host: int = LINK_CHECK_PER_HOST,
+        timeout: float = LINK_CHECK_TIMEOUT,
+    ):
+        self.per_host = per_host
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="links")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=64, pool_maxsize=per_host)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # Checks handed to the pool and checks queued per host, hosts are
+        # dropped once they have neither.
+        self.running = Counter()
+        self.waiting = defaultdict(deque)
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.results = LRUCache()
+
+    def _cache(self):
+        # Results only expire, nothing invalidates them, so the per process
+        # cache is safe to use when no shared cache is configured.
+        return self.results if CACHE_BACKEND == "none" else get_cache()
+
+    def _request(self, url: str) -> bool:
+        try:
+            response = self.session.head(
+                url, allow_redirects=True, timeout=self.timeout
+            )
+
+            if response.status_code in HEAD_UNSUPPORTED:
+                # Streamed, so only the headers are read before the close.
+                response = self.session.get(
+                    url, allow_redirects=True, timeout=self.timeout, stream=True
+                )
+                response.close()
+
+            return 200 <= response.status_code < 300
+        except Exception as e:
+            logger.info("Link check failed for %s: %s", url, e)
+            return False
+
+    def _check(self, url: str) -> bool:
+        valid = self._request(url)
+        ttl = LINK_TTL if valid else LINK_NEGATIVE_TTL
+        entry = json.dumps({"valid": valid, "expires_at": time.time() + ttl})
+
+        try:
+            self._cache().set(_cache_key(url), entry, ttl + LINK_STALE_TTL)
+        except Exception as e:
+            logger.warning("Cache write failed for %s: %s", url, e)
+
+        return valid
+
+    def _run(self, url: str, future: Future) -> None:
+        host = urlsplit(url).netloc
+
+        try:
+            future.set_result(self._check(url))
+        finally:
+            with self.lock:
+                self.in_flight.pop(url, None)
+                waiting = self.waiting.get(host)
+
+                if waiting:
+                    self.executor.submit(self._run, *waiting.popleft())
+
+                    if not waiting:
+                        del self.waiting[host]
+                else:
+                    self.running[host] -= 1
+
+                    if not self.running[host]:
+                        del self.running[host]
+
+    def _submit(self, url: str) -> Future:
+        host = urlsplit(url).netloc
+
+        with self.lock:
+            future = self.in_flight.get(url)
+
+            if future is None:
+                future = self.in_flight[url] = Future()
+
+                if self.running[host] < self.per_host:
+                    self.running[host] += 1
+                    self.executor.submit(self._run, url, future)
+                else:
+                    self.waiting[host].append((url, future))
+
+            return future
+
+    def _lookup(self, url: str) -> dict | None:
+        try:
+            entry = self._cache().get(_cache_key(url))
+        except Exception as e:
+            logger.warning("Cache read failed for %s: %s", url, e)
+            return None
+
+        return json.loads(entry) if entry is not None else None
+
+    def invalid_urls(self, urls, timeout: float | None = None) -> list:
+        """Return those of ``urls`` that are dead or could not be checked.
+
+        Cached results are used as is and refreshed in the background once
+        expired. Links without one are checked concurrently and waited for
+        up to ``timeout`` seconds, the request timeout by default. Ones still
+        unanswered after that are rejected as well, their check finishes in
+        the background and is cached for the next upload.
+        """
+        normalized = {url: normalize_url(url) for url in urls}
+        valid = {}
+        pending = {}
+
+        for url in set(normalized.values()):
+            entry = self._lookup(url)
+
+            if entry is None:
+                pending[url] = self._submit(url)
+                continue
+
+            if entry["expires_at"] < time.time():
+                self._submit(url)
+
+            valid[url] = entry["valid"]
+
+        if pending:
+            done, _ = wait(
+                pending.values(), timeout=self.timeout if timeout is None else timeout
+            )
+
+            for url, future in pending.items():
+                valid[url] = future in done and future.result()
+
+        return [url for url in urls if not valid[normalized[url]]]
+
+
+_validator = None
+_validator_lock = threading.Lock()
+
+
+def get_link_validator() -> LinkValidator:
+    global _validator
+
+    if _validator is None:
+        with _validator_lock:
+            if _validator is None:
+                _validator = LinkValidator()
+
+    return _validator
+
+
+@timed("url_validation")
+def invalid_urls(urls) -> list:
+    return get_link_validator().invalid_urls(list(urls))
@@ -0,0 +1,263 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from flask import Flask, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from core.cache import cache_stats
+from core.config import METRICS_TOKEN, SERVER_TIMING, SLOW_REQUEST_MS
+import hmac
+import re
+import threading
+import time
+
+# Upper bounds (seconds) of the request duration histogram buckets.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Bound parameters, also the expanded placeholder lists of IN (...) clauses,
+# so statements that only differ in their values share a fingerprint.
+_PLACEHOLDER_LIST = re.compile(
+    r"\(\s*(?:\?|%s|%\(\w+\)s)(?:\s*,\s*(?:\?|%s|%\(\w+\)s))*\s*\)"
+)
+_NUMBER = re.compile(r"\b\d+\b")
+# The column list says nothing about the access path and buries the rest.
+_SELECT_LIST = re.compile(r"^SELECT (DISTINCT )?.+? FROM ")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.statements = Counter()
+        self.db_seconds = 0.0
+        self.timings = defaultdict(float)
+        self.active = set()
+
+    @property
+    def statement_count(self) -> int:
+        return sum(self.statements.values())
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.requests = Counter()
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.duration_count = 0
+        self.duration_sum = 0.0
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.timings = defaultdict(float)
+
+
+_routes = defaultdict(RouteMetrics)
+_lock = threading.Lock()
+
+
+def fingerprint(statement: str) -> str:
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _PLACEHOLDER_LIST.sub("(?)", statement)
+    statement = _NUMBER.sub("?", statement)
+
+    return _SELECT_LIST.sub(r"SELECT \1... FROM ", statement)
+
+
+def _current() -> RequestMetrics | None:
+    if has_request_context():
+        return g.get("metrics")
+
+    return None
+
+
+@contextmanager
+def timed(kind: str):
+    """Add the time spent in the block to the current request's ``kind``
+    total, e.g. "serialize" or an external service such as "s3". Nested
+    blocks of the same kind are only counted once. Also usable as a
+    decorator."""
+    metrics = _current()
+
+    if metrics is None or kind in metrics.active:
+        yield
+        return
+
+    metrics.active.add(kind)
+    started_at = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        metrics.timings[kind] += time.perf_counter() - started_at
+        metrics.active.discard(kind)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_at = conn.info["query_started_at"].pop()
+    metrics = _current()
+
+    if metrics is not None:
+        metrics.db_seconds += time.perf_counter() - started_at
+        metrics.statements[fingerprint(statement)] += 1
+
+
+def _route() -> str:
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+def _record(metrics: RequestMetrics, status: int, duration: float) -> None:
+    with _lock:
+        route = _routes[(request.method, _route())]
+        route.requests[status] += 1
+        route.duration_count += 1
+        route.duration_sum += duration
+        route.statements += metrics.statement_count
+        route.db_seconds += metrics.db_seconds
+
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if duration <= bound:
+                route.buckets[i] += 1
+
+        for kind, seconds in metrics.timings.items():
+            route.timings[kind] += seconds
+
+
+def _server_timing(metrics: RequestMetrics, duration: float) -> str:
+    entries = [
+        f'db;dur={metrics.db_seconds * 1000:.1f};desc="{metrics.statement_count} queries"'
+    ]
+    entries.extend(
+        f"{kind};dur={seconds * 1000:.1f}" for kind, seconds in metrics.timings.items()
+    )
+    entries.append(f"total;dur={duration * 1000:.1f}")
+
+    return ", ".join(entries)
+
+
+def _log_slow_request(metrics: RequestMetrics, status: int, duration: float) -> None:
+    lines = [
+        f"Slow request {request.method} {request.full_path.rstrip('?')} {status}: "
+        f"{duration * 1000:.0f} ms, {metrics.statement_count} queries in "
+        f"{metrics.db_seconds * 1000:.0f} ms"
+        + "".join(
+            f", {kind} {seconds * 1000:.0f} ms"
+            for kind, seconds in metrics.timings.items()
+        )
+    ]
+    lines.extend(
+        f"  {count}x {statement[:300]}"
+        for statement, count in metrics.statements.most_common()
+    )
+
+    current_app.logger.warning("\n".join(lines))
+
+
+def init_app(app: Flask) -> None:
+    @app.before_request
+    def start_request_metrics():
+        g.metrics = RequestMetrics()
+
+    @app.after_request
+    def finish_request_metrics(response):
+        metrics = g.pop("metrics", None)
+
+        if metrics is None:
+            return response
+
+        duration = time.perf_counter() - metrics.started_at
+        _record(metrics, response.status_code, duration)
+
+        if SERVER_TIMING:
+            response.headers["Server-Timing"] = _server_timing(metrics, duration)
+
+        if duration * 1000 >= SLOW_REQUEST_MS:
+            _log_slow_request(metrics, response.status_code, duration)
+
+        return response
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    return (
+        "{"
+        + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+        + "}"
+    )
+
+
+def metrics_authorized() -> bool:
+    """Whether the current request carries METRICS_TOKEN as a bearer token."""
+    if not METRICS_TOKEN:
+        return False
+
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+
+    return scheme.lower() == "bearer" and hmac.compare_digest(
+        token.encode(), METRICS_TOKEN.encode()
+    )
+
+
+def render_metrics() -> str:
+    """Metrics of this process in the Prometheus text exposition format."""
+    lines = []
+
+    def metric(name: str, kind: str, help: str) -> None:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    with _lock:
+        routes = sorted(_routes.items())
+
+        metric("gotstyle_requests_total", "counter", "Requests handled.")
+        for (method, route), stats in routes:
+            for status, count in sorted(stats.requests.items()):
+                labels = _labels(method=method, route=route, status=status)
+                lines.append(f"gotstyle_requests_total{labels} {count}")
+
+        metric("gotstyle_request_duration_seconds", "histogram", "Request latency.")
+        for (method, route), stats in routes:
+            name = "gotstyle_request_duration_seconds"
+
+            for bound, count in zip(DURATION_BUCKETS, stats.buckets):
+                labels = _labels(method=method, route=route, le=bound)
+                lines.append(f"{name}_bucket{labels} {count}")
+
+            labels = _labels(method=method, route=route, le="+Inf")
+            lines.append(f"{name}_bucket{labels} {stats.duration_count}")
+            labels = _labels(method=method, route=route)
+            lines.append(f"{name}_sum{labels} {stats.duration_sum:.6f}")
+            lines.append(f"{name}_count{labels} {stats.duration_count}")
+
+        metric("gotstyle_db_statements_total", "counter", "SQL statements executed.")
+        for (method, route), stats in routes:
+            labels = _labels(method=method, route=route)
+            lines.append(f"gotstyle_db_statements_total{labels} {stats.statements}")
+
+        metric("gotstyle_db_seconds_total", "counter", "Time spent in SQL statements.")
+        for (method, route), stats in routes:
+            labels = _labels(method=method, route=route)
+            lines.append(f"gotstyle_db_seconds_total{labels} {stats.db_seconds:.6f}")
+
+        metric(
+            "gotstyle_timed_seconds_total",
+            "counter",
+            "Time spent serializing and calling external services.",
+        )
+        for (method, route), stats in routes:
+            for kind, seconds in sorted(stats.timings.items()):
+                labels = _labels(method=method, route=route, kind=kind)
+                lines.append(f"gotstyle_timed_seconds_total{labels} {seconds:.6f}")
+
+    metric("gotstyle_cache_requests_total", "counter", "Read-through cache lookups.")
+    for kind, stats in sorted(cache_stats().items()):
+        for result, count in sorted(stats.items()):
+            labels = _labels(kind=kind, result=result)
+            lines.append(f"gotstyle_cache_requests_total{labels} {count}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,333 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import false, func, select
+from core.push import enqueue_push_notification
+from db import db, upsert
+from models import (
+    Notification,
+    NotificationActor,
+    NotificationEvent,
+    PushMessage,
+    User,
+)
+import time
+import uuid
+
+# Events for the same recipient, action and entity inside one bucket are
+# folded into a single notification ("X and 48 others liked your outfit").
+GROUP_BUCKET = timedelta(hours=6)
+# A recipient gets at most one push per cooldown, later activity in the window
+# only shows up in the inbox.
+PUSH_COOLDOWN = timedelta(minutes=5)
+
+PUSH_MESSAGES = {
+    ("like", "outfit"): "liked your outfit!",
+    ("save", "outfit"): "saved your outfit!",
+    ("comment", "comment"): "commented on your outfit!",
+    ("reply", "comment_answer"): "replied to your comment!",
+    ("like", "comment"): "liked your comment!",
+    ("like", "comment_answer"): "liked your reply!",
+}
+
+
+def _adjust_unread(user_id: str, delta: int) -> None:
+    if delta:
+        db.session.query(User).filter_by(id=user_id).update(
+            {User.unread_notification_count: User.unread_notification_count + delta}
+        )
+
+
+def add_notification(
+    user_id: str, action_type: str, entity_id: str, entity_type: str, sender_id: str
+) -> Notification:
+    notification = Notification(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        action_type=action_type,
+        entity_id=entity_id,
+        entity_type=entity_type,
+        sender_id=sender_id,
+        is_read=False,
+        created_at=datetime.utcnow(),
+    )
+
+    db.session.add(notification)
+    _adjust_unread(user_id, 1)
+
+    return notification
+
+
+def delete_notification(notification: Notification) -> None:
+    if not notification.is_read:
+        _adjust_unread(notification.user_id, -1)
+
+    NotificationActor.query.filter_by(notification_id=notification.id).delete(
+        synchronize_session=False
+    )
+    db.session.delete(notification)
+
+
+def mark_read(notification: Notification) -> None:
+    if not notification.is_read:
+        notification.is_read = True
+        _adjust_unread(notification.user_id, -1)
+
+
+def mark_all_read(user_id: str) -> int:
+    read = Notification.query.filter_by(user_id=user_id, is_read=False).update(
+        {Notification.is_read: True}, synchronize_session=False
+    )
+    _adjust_unread(user_id, -read)
+
+    return read
+
+
+def reconcile_unread_counts() -> int:
+    unread = (
+        select(func.count())
+        .select_from(Notification)
+        .where(Notification.user_id == User.id, Notification.is_read == false())
+        .scalar_subquery()
+    )
+
+    repaired = db.session.execute(
+        User.__table__.update()
+        .where(User.unread_notification_count != unread)
+        .values(unread_notification_count=unread)
+    ).rowcount
+    db.session.commit()
+
+    return repaired
+
+
+def record_event(
+    user_id: str,
+    action_type: str,
+    entity_id: str,
+    entity_type: str,
+    sender_id: str,
+    group_entity_id: str = None,
+) -> None:
+    """Queue an activity event, fold_pending_events() turns it into a grouped
+    notification and push.
+
+    Events are grouped by ``entity_id`` unless ``group_entity_id`` is given,
+    which lets events about new entities (a comment, a reply) fold by their
+    parent. ``entity_id`` is what the notification links to.
+    """
+    db.session.add(
+        NotificationEvent(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            action_type=action_type,
+            entity_id=entity_id,
+            entity_type=entity_type,
+            group_entity_id=group_entity_id,
+            sender_id=sender_id,
+            created_at=datetime.utcnow(),
+        )
+    )
+
+
+def group_key(event: NotificationEvent) -> str:
+    bucket = int(event.created_at.timestamp() // GROUP_BUCKET.total_seconds())
+
+    return ":".join(
+        [
+            event.user_id,
+            event.action_type,
+            event.entity_type,
+            event.group_entity_id or event.entity_id,
+            str(bucket),
+        ]
+    )
+
+
+def _push_body(notification: Notification, sender: User | None) -> str:
+    action = PUSH_MESSAGES.get(
+        (notification.action_type, notification.entity_type), "interacted with you!"
+    )
+    name = sender.username if sender else "Someone"
+    others = notification.actor_count - 1
+
+    if others == 1:
+        return f"{name} and 1 other {action}"
+
+    if others > 1:
+        return f"{name} and {others} others {action}"
+
+    return f"{name} {action}"
+
+
+def _enqueue_pushes(notifications: list) -> None:
+    by_recipient = defaultdict(list)
+    for notification in notifications:
+        by_recipient[notification.user_id].append(notification)
+
+    if not by_recipient:
+        return
+
+    users = {
+        user.id: user
+        for user in User.query.filter(
+            User.id.in_(
+                set(by_recipient)
+                | {notification.sender_id for notification in notifications}
+            )
+        ).all()
+    }
+
+    tokens = {
+        user_id: users[user_id].expo_push_token
+        for user_id in by_recipient
+        if user_id in users and users[user_id].expo_push_token
+    }
+
+    if not tokens:
+        return
+
+    recently_pushed = {
+        to
+        for (to,) in db.session.query(PushMessage.to)
+        .filter(
+            PushMessage.to.in_(set(tokens.values())),
+            PushMessage.created_at >= datetime.utcnow() - PUSH_COOLDOWN,
+        )
+        .distinct()
+        .all()
+    }
+
+    for user_id, token in tokens.items():
+        if token in recently_pushed:
+            continue
+
+        grouped = by_recipient[user_id]
+
+        if len(grouped) == 1:
+            body = _push_body(grouped[0], users.get(grouped[0].sender_id))
+        else:
+            body = f"You have {len(grouped)} new notifications"
+
+        enqueue_push_notification(token, "GotStyle", body)
+        recently_pushed.add(token)
+
+
+def fold_pending_events(limit: int = 1000) -> int:
+    """Fold up to ``limit`` queued events into grouped notifications.
+
+    Every touched group costs one row update, actors are written with a
+    single executemany and at most one push is queued per recipient.
+    Returns the number of events consumed.
+    """
+    query = NotificationEvent.query.order_by(NotificationEvent.created_at)
+
+    if db.engine.dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+
+    events = query.limit(limit).all()
+
+    if not events:
+        return 0
+
+    groups = defaultdict(list)
+    for event in events:
+        groups[group_key(event)].append(event)
+
+    # Concurrent workers can fold events of the same group, so every group's
+    # row is upserted first. A new one starts out read and without actors and
+    # is surfaced below like any other; the upsert also locks existing rows
+    # until the commit, so actor counts are never updated concurrently.
+    upsert(
+        Notification.__table__,
+        [
+            {
+                "id": str(uuid.uuid4()),
+                "user_id": group[0].user_id,
+                "action_type": group[0].action_type,
+                "entity_id": group[0].entity_id,
+                "entity_type": group[0].entity_type,
+                "sender_id": group[0].sender_id,
+                "is_read": True,
+                "created_at": group[0].created_at,
+                "group_key": key,
+                "actor_count": 0,
+            }
+            for key, group in sorted(groups.items())
+        ],
+        ["group_key"],
+        lambda proposed: {"group_key": proposed.group_key},
+    )
+
+    notifications = {
+        notification.group_key: notification
+        for notification in Notification.query.filter(
+            Notification.group_key.in_(list(groups))
+        )
+        .populate_existing()
+        .all()
+    }
+
+    known_actors = set(
+        db.session.query(NotificationActor.notification_id, NotificationActor.user_id)
+        .filter(
+            NotificationActor.notification_id.in_(
+                [notification.id for notification in notifications.values()]
+            )
+        )
+        .all()
+    )
+
+    unread = defaultdict(int)
+    actors = []
+    surfaced = []
+
+    for key, group in groups.items():
+        notification = notifications[key]
+        senders = list(
+            dict.fromkeys(
+                event.sender_id
+                for event in group
+                if (notification.id, event.sender_id) not in known_actors
+            )
+        )
+
+        if not senders:
+            continue
+
+        actors.extend(
+            {"notification_id": notification.id, "user_id": sender_id}
+            for sender_id in senders
+        )
+        notification.actor_count += len(senders)
+        notification.sender_id = senders[-1]
+        notification.entity_id = group[-1].entity_id
+        notification.created_at = group[-1].created_at
+
+        if notification.is_read:
+            notification.is_read = False
+            unread[notification.user_id] += 1
+
+        surfaced.append(notification)
+
+    db.session.flush()
+
+    if actors:
+        db.session.execute(NotificationActor.__table__.insert(), actors)
+
+    for user_id, delta in sorted(unread.items()):
+        _adjust_unread(user_id, delta)
+
+    _enqueue_pushes(surfaced)
+
+    NotificationEvent.query.filter(
+        NotificationEvent.id.in_([event.id for event in events])
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+    return len(events)
+
+
+def run_notification_worker(poll_interval: float = 1.0) -> None:
+    while True:
+        if fold_pending_events() == 0:
+            time.sleep(poll_interval)
@@ -0,0 +1,86 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from flask import jsonify, request, Response
+from sqlalchemy import and_, desc, or_
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(created_at: datetime, id: str) -> str:
+    raw = f"{created_at.isoformat()}|{id}".encode()
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, id = urlsafe_b64decode(padded).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def encode_rank_cursor(score: float, id: str) -> str:
+    raw = f"{score!r}|{id}".encode()
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_rank_cursor(cursor: str) -> tuple[float, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, id = urlsafe_b64decode(padded).decode().split("|", 1)
+        return float(score), id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def get_limit(default: int = DEFAULT_PAGE_SIZE) -> int:
+    try:
+        limit = int(request.args.get("limit", default))
+    except ValueError:
+        raise ValueError("Invalid limit")
+
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def paginate(query, created_at_column, id_column) -> tuple[list, str | None]:
+    """Keyset-paginate ``query`` newest first on ``(created_at, id)``.
+
+    Reads ``limit`` and ``cursor`` from the request args and raises
+    ``ValueError`` if either is malformed.
+    """
+    limit = get_limit()
+    cursor = request.args.get("cursor")
+
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        query = query.filter(
+            or_(
+                created_at_column < created_at,
+                and_(created_at_column == created_at, id_column < id),
+            )
+        )
+
+    rows = (
+        query.order_by(desc(created_at_column), desc(id_column)).limit(limit + 1).all()
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            getattr(last, created_at_column.key), getattr(last, id_column.key)
+        )
+
+    return rows, next_cursor
+
+
+def paginated_response(items: list, next_cursor: str | None) -> Response:
+    response = jsonify(items)
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    return response
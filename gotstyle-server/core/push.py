@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from sqlalchemy import or_
+from core.config import EXPO_PUSH_URL
+from core.metrics import timed
+from db import db
+from models import PushMessage
+import requests
+import time
+import uuid
+
+# Expo accepts at most 100 messages per push request.
+EXPO_BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 30
+REQUEST_TIMEOUT = (3, 10)
+# Sent and failed messages are kept this long for debugging, then purged.
+# Must stay above the push cooldown in core.notifications, which looks at
+# recent messages.
+RETENTION = timedelta(days=7)
+
+_session = None
+
+
+def get_session() -> requests.Session:
+    global _session
+
+    if _session is None:
+        _session = requests.Session()
+        _session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        _session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        _session.headers.update(
+            {
+                "Accept": "application/json",
+                "Accept-Encoding": "gzip, deflate",
+                "Content-Type": "application/json",
+            }
+        )
+
+    return _session
+
+
+def enqueue_push_notification(to: str | None, title: str, body: str) -> None:
+    if not to:
+        return
+
+    db.session.add(
+        PushMessage(
+            id=str(uuid.uuid4()),
+            to=to,
+            title=title,
+            body=body,
+            status="Pending",
+            attempts=0,
+            created_at=datetime.utcnow(),
+            next_attempt_at=datetime.utcnow(),
+        )
+    )
+
+
+def _retry_later(message: PushMessage, error: str) -> None:
+    message.attempts += 1
+    message.error = error[:200]
+
+    if message.attempts >= MAX_ATTEMPTS:
+        message.status = "Failed"
+        return
+
+    delay = BACKOFF_SECONDS * 2 ** (message.attempts - 1)
+    message.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+
+
+def _send_batch(messages: list) -> None:
+    payload = [
+        {"to": message.to, "title": message.title, "body": message.body}
+        for message in messages
+    ]
+
+    try:
+        with timed("expo"):
+            response = get_session().post(
+                EXPO_PUSH_URL, json=payload, timeout=REQUEST_TIMEOUT
+            )
+    except requests.RequestException as e:
+        for message in messages:
+            _retry_later(message, f"Request failed: {e}")
+        return
+
+    if response.status_code == 429 or response.status_code >= 500:
+        for message in messages:
+            _retry_later(message, f"Expo responded with {response.status_code}")
+        return
+
+    try:
+        tickets = response.json()["data"]
+    except (ValueError, KeyError, TypeError):
+        tickets = []
+
+    if response.status_code != 200 or len(tickets) != len(messages):
+        for message in messages:
+            message.status = "Failed"
+            message.attempts += 1
+            message.error = f"Expo rejected batch with {response.status_code}"
+        return
+
+    for message, ticket in zip(messages, tickets):
+        message.attempts += 1
+
+        if ticket.get("status") == "ok":
+            message.status = "Sent"
+            message.sent_at = datetime.utcnow()
+            message.error = None
+            continue
+
+        error = (ticket.get("details") or {}).get("error") or ticket.get("message")
+        if error == "MessageRateExceeded":
+            message.attempts -= 1
+            _retry_later(message, error)
+        else:
+            message.status = "Failed"
+            message.error = (error or "Unknown error")[:200]
+
+
+def dispatch_pending(limit: int = 500) -> int:
+    """Send up to ``limit`` due messages in Expo-sized batches.
+
+    Returns the number of messages that were attempted.
+    """
+    query = PushMessage.query.filter(
+        PushMessage.status == "Pending",
+        or_(
+            PushMessage.next_attempt_at.is_(None),
+            PushMessage.next_attempt_at <= datetime.utcnow(),
+        ),
+    ).order_by(PushMessage.next_attempt_at)
+
+    if db.engine.dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+
+    messages = query.limit(limit).all()
+
+    for start in range(0, len(messages), EXPO_BATCH_SIZE):
+        _send_batch(messages[start : start + EXPO_BATCH_SIZE])
+
+    db.session.commit()
+
+    return len(messages)
+
+
+def purge_old_messages() -> int:
+    cutoff = datetime.utcnow() - RETENTION
+
+    purged = PushMessage.query.filter(
+        PushMessage.status != "Pending", PushMessage.created_at < cutoff
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+    return purged
+
+
+def run_push_worker(poll_interval: float = 1.0) -> None:
+    while True:
+        if dispatch_pending() == 0:
+            time.sleep(poll_interval)
@@ -0,0 +1,160 @@
+from collections import Counter
+from contextlib import ContextDecorator
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, func
+from core.cache import LRUCache, get_cache, set_cache
+from core.metrics import fingerprint
+from db import db
+from models import Outfit, User
+import threading
+
+# A statement shape that runs more often than this within one request grows
+# with the number of rows on the page, i.e. it is an N+1. Nested serializers
+# legitimately repeat a few shapes, a profile looks users up once per level,
+# so datasets used with a budget need pages of more rows than this.
+MAX_REPEATS = 4
+
+# Statements allowed per request for the hot endpoints. The serializers batch
+# every relation, so these hold for any dataset size: a regression that
+# loads a relation per row blows the budget as soon as a page has a few rows.
+ENDPOINT_BUDGETS = {
+    "/outfits/": 18,
+    "/outfits/{outfit_id}": 18,
+    "/users/me": 32,
+    "/users/{user_id}": 32,
+    "/users/{user_id}/followers": 5,
+    "/users/{user_id}/liked-outfits": 18,
+    "/users/following-outfits": 20,
+    "/users/unread-notifications": 12,
+    "/users/closest-users": 5,
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryRecorder(ContextDecorator):
+    """Record the statements run by this thread while the block is active."""
+
+    def __init__(self):
+        self.statements = Counter()
+        self.thread = None
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self.thread:
+            self.statements[fingerprint(statement)] += 1
+
+    def __enter__(self):
+        self.statements.clear()
+        self.thread = threading.get_ident()
+        event.listen(db.engine, "before_cursor_execute", self._record)
+
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(db.engine, "before_cursor_execute", self._record)
+
+        return False
+
+    @property
+    def count(self) -> int:
+        return sum(self.statements.values())
+
+    def repeated(self, max_repeats: int = MAX_REPEATS) -> dict:
+        return {
+            statement: count
+            for statement, count in self.statements.items()
+            if count > max_repeats
+        }
+
+    def report(self) -> str:
+        return "\n".join(
+            f"  {count}x {statement}"
+            for statement, count in self.statements.most_common()
+        )
+
+
+class QueryBudget(QueryRecorder):
+    def __init__(self, max_queries: int, max_repeats: int = MAX_REPEATS):
+        super().__init__()
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+
+    def __exit__(self, *exc):
+        super().__exit__(*exc)
+
+        if exc[0] is not None:
+            return False
+
+        problems = []
+
+        if self.count > self.max_queries:
+            problems.append(f"{self.count} queries, budget is {self.max_queries}")
+
+        for statement, count in self.repeated(self.max_repeats).items():
+            problems.append(f"N+1: {count}x {statement}")
+
+        if problems:
+            raise QueryBudgetExceeded(
+                "\n".join(problems) + "\nStatements:\n" + self.report()
+            )
+
+        return False
+
+
+def query_budget(max_queries: int, max_repeats: int = MAX_REPEATS) -> QueryBudget:
+    """Fail with QueryBudgetExceeded when the block runs more than
+    ``max_queries`` statements or repeats a statement shape more than
+    ``max_repeats`` times. Works as a context manager and as a decorator:
+
+        with query_budget(18):
+            client.get("/outfits/", headers=headers)
+    """
+    return QueryBudget(max_queries, max_repeats)
+
+
+def check_query_budgets(app) -> dict:
+    """Request every endpoint in ENDPOINT_BUDGETS as the user with the most
+    outfits, with the read-through cache bypassed, and return
+    ``{path: failure}`` for those over budget or not answering 200. Endpoints
+    about an outfit are skipped when nobody has one."""
+    user = (
+        User.query.outerjoin(Outfit, Outfit.user_id == User.id)
+        .group_by(User.id)
+        .order_by(func.count(Outfit.id).desc())
+        .first()
+    )
+
+    if user is None:
+        return {}
+
+    outfit = Outfit.query.filter_by(user_id=user.id).first()
+    headers = {"Authorization": f"Bearer {create_access_token(identity=user.id)}"}
+    client = app.test_client()
+    failures = {}
+
+    cache = get_cache()
+    set_cache(LRUCache(max_entries=0))
+
+    try:
+        for path, budget in ENDPOINT_BUDGETS.items():
+            if outfit is None and "{outfit_id}" in path:
+                continue
+
+            path = path.format(user_id=user.id, outfit_id=outfit.id if outfit else None)
+
+            try:
+                with query_budget(budget):
+                    response = client.get(path, headers=headers)
+            except QueryBudgetExceeded as e:
+                failures[path] = str(e)
+
+            # An error response runs a fraction of the page's statements, so
+            # its count says nothing about the budget.
+            if response.status_code != 200:
+                failures[path] = f"responded {response.status_code}, expected 200"
+    finally:
+        set_cache(cache)
+
+    return failures
@@ -0,0 +1,142 @@
+from sqlalchemy import select
+from db import db
+from models import (
+    Comment,
+    CommentAnswer,
+    Follow,
+    Notification,
+    Outfit,
+    OutfitHashtag,
+    OutfitImage,
+    OutfitLink,
+    OutfitSearchToken,
+    TimelineEntry,
+    TokenBlockList,
+    comment_likes,
+    comment_reply_likes,
+    outfit_like,
+    outfit_save,
+)
+from datetime import datetime
+import re
+
+# Placeholder values, only the shape of the statements matters to the planner.
+ID = "00000000-0000-0000-0000-000000000000"
+IDS = [ID, "ffffffff-ffff-ffff-ffff-ffffffffffff"]
+NOW = datetime(2024, 1, 1)
+
+# The statements behind the hot endpoints. Every one of them must be answered
+# from an index, check_query_plans() reports the ones that are not.
+HOT_QUERIES = {
+    "outfit feed page": lambda: (
+        select(Outfit.id)
+        .where(Outfit.created_at < NOW)
+        .order_by(Outfit.created_at.desc(), Outfit.id.desc())
+        .limit(21)
+    ),
+    "outfits by user": lambda: (
+        select(Outfit.id).where(Outfit.user_id == ID).order_by(Outfit.created_at.desc())
+    ),
+    "comments by outfit": lambda: select(Comment.id).where(Comment.outfit_id.in_(IDS)),
+    "answers by comment": lambda: select(CommentAnswer.id).where(
+        CommentAnswer.comment_id.in_(IDS)
+    ),
+    "comment likes": lambda: select(comment_likes.c.user_id).where(
+        comment_likes.c.comment_id.in_(IDS)
+    ),
+    "comment answer likes": lambda: select(comment_reply_likes.c.user_id).where(
+        comment_reply_likes.c.comment_answer_id.in_(IDS)
+    ),
+    "unread notifications": lambda: (
+        select(Notification.id)
+        .where(Notification.user_id == ID, Notification.is_read.is_(False))
+        .order_by(Notification.created_at.desc())
+    ),
+    "follow lookup": lambda: select(Follow.id).where(
+        Follow.follower_id == ID, Follow.followee_id == ID
+    ),
+    "followers": lambda: select(Follow.follower_id).where(
+        Follow.followee_id == ID, Follow.status == "Accepted"
+    ),
+    "following": lambda: select(Follow.followee_id).where(
+        Follow.follower_id == ID, Follow.status == "Accepted"
+    ),
+    "outfit images": lambda: select(OutfitImage.id).where(
+        OutfitImage.outfit_id.in_(IDS)
+    ),
+    "outfit links": lambda: select(OutfitLink.id).where(OutfitLink.outfit_id.in_(IDS)),
+    "outfit hashtags": lambda: select(OutfitHashtag.id).where(
+        OutfitHashtag.outfit_id.in_(IDS)
+    ),
+    "hashtag search": lambda: select(OutfitHashtag.outfit_id).where(
+        OutfitHashtag.normalized == "ootd"
+    ),
+    "liked outfits": lambda: select(outfit_like.c.outfit_id).where(
+        outfit_like.c.user_id == ID
+    ),
+    "saved outfits": lambda: select(outfit_save.c.outfit_id).where(
+        outfit_save.c.user_id == ID
+    ),
+    "timeline page": lambda: (
+        select(TimelineEntry.outfit_id)
+        .where(TimelineEntry.user_id == ID)
+        .order_by(TimelineEntry.created_at.desc(), TimelineEntry.outfit_id.desc())
+        .limit(21)
+    ),
+    "search tokens": lambda: select(OutfitSearchToken.outfit_id).where(
+        OutfitSearchToken.token.in_(["red", "dress"])
+    ),
+    "token blocklist": lambda: select(TokenBlockList.id).where(
+        TokenBlockList.jti == ID
+    ),
+}
+
+
+def explain(statement) -> list:
+    dialect = db.engine.dialect.name
+    compiled = statement.compile(
+        dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}
+    )
+
+    with db.engine.connect() as connection:
+        if dialect == "sqlite":
+            rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")
+            return [row[-1] for row in rows]
+
+        if dialect == "postgresql":
+            # Small tables are cheaper to scan, so take that option away to see
+            # whether an index could serve the query at all. LOCAL keeps the
+            # setting from leaking into the pooled connection.
+            connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            rows = connection.exec_driver_sql(f"EXPLAIN {compiled}")
+            return [row[0] for row in rows]
+
+        rows = connection.exec_driver_sql(f"EXPLAIN {compiled}").mappings()
+        return [f"{row['table']} {row['type']} {row['key']}" for row in rows]
+
+
+def full_scans(plan: list) -> list:
+    dialect = db.engine.dialect.name
+
+    if dialect == "sqlite":
+        pattern = re.compile(r"^SCAN (\w+)$")
+    elif dialect == "postgresql":
+        pattern = re.compile(r"Seq Scan on (\w+)")
+    else:
+        pattern = re.compile(r"^(\w+) ALL ")
+
+    return [match.group(1) for line in plan if (match := pattern.search(line))]
+
+
+def check_query_plans() -> dict:
+    """Return ``{query name: [tables scanned without an index]}`` for every hot
+    query that is not fully index backed."""
+    failures = {}
+
+    for name, build in HOT_QUERIES.items():
+        scanned = full_scans(explain(build()))
+
+        if scanned:
+            failures[name] = scanned
+
+    return failures
@@ -1,94 +1,134 @@
-from base64 import b64decode
 from io import BytesIO
-from PIL import Image, ImageFilter, ImageEnhance
-from core.config import (
-    BUCKET_NAME,
-    AWS_ACCESS_KEY,
-    AWS_SECRET_KEY,
-    CLOUDFRONT_DOMAIN,
-    CLOUDFRONT_DISTRIBUTION_ID,
-)
-from flask import jsonify
-from datetime import datetime
-import boto3
-import uuid
-
-
-def upload_to_s3(photo_base64: str, id: str, img_type: str) -> str:
-    def get_image_format(image_bytes: bytes) -> str:
-        magic_numbers = {
-            b"\xff\xd8": "JPEG",
-            b"\x89PNG": "PNG",
-            b"GIF8": "GIF",
-            b"BM": "BMP",
-            b"\x00\x00\x01\x00": "ICO",
-        }
-
-        for magic, format_name in magic_numbers.items():
-            if image_bytes.startswith(magic):
-                return format_name
-
-        return "UNKNOWN"
-
-    image_data = b64decode(photo_base64)
-    image_format = get_image_format(image_data[:8])
+from typing import BinaryIO
+from PIL import Image, ImageEnhance, features
+from core.storage import get_storage
+import hashlib
+
+# Widths rendered for every upload. "full" is what image_url points at.
+IMAGE_VARIANTS = {
+    "outfit_image": {"thumb": 200, "feed": 400, "full": 800},
+    "profile_picture": {"thumb": 100, "full": 400},
+}
+
+WEBP_SUPPORTED = features.check("webp")
+
+CHUNK_SIZE = 64 * 1024
+
+
+def get_image_format(image_bytes: bytes) -> str:
+    magic_numbers = {
+        b"\xff\xd8": "JPEG",
+        b"\x89PNG": "PNG",
+        b"GIF8": "GIF",
+        b"BM": "BMP",
+        b"\x00\x00\x01\x00": "ICO",
+    }
+
+    for magic, format_name in magic_numbers.items():
+        if image_bytes.startswith(magic):
+            return format_name
+
+    return "UNKNOWN"
+
+
+def check_dimensions(fileobj: BinaryIO) -> None:
+    """Raise ValueError unless ``fileobj`` is an image of at most
+    Image.MAX_IMAGE_PIXELS pixels. Only the header is read, so a tiny file
+    that decompresses to a huge bitmap is refused before it is decoded."""
+    position = fileobj.tell()
+
+    try:
+        width, height = Image.open(fileobj).size
+    except Image.DecompressionBombError:
+        raise ValueError("Image is too large")
+    except OSError:
+        raise ValueError("Unknown image format")
+    finally:
+        fileobj.seek(position)
+
+    if Image.MAX_IMAGE_PIXELS and width * height > Image.MAX_IMAGE_PIXELS:
+        raise ValueError("Image is too large")
+
+
+def _encode(image: Image.Image, image_format: str) -> tuple[bytes, str]:
+    if image_format in ("WEBP", "PNG"):
+        mode = (
+            "RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB"
+        )
+    else:
+        image_format, mode = "JPEG", "RGB"
+
+    if image.mode != mode:
+        image = image.convert(mode)
+
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, quality=80)
+
+    return buffer.getvalue(), image_format
+
+
+def file_digest(fileobj: BinaryIO) -> str:
+    digest = hashlib.sha256()
+
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+        digest.update(chunk)
+
+    fileobj.seek(0)
+
+    return digest.hexdigest()
+
+
+def process_image(fileobj: BinaryIO, img_type: str) -> tuple[str, dict]:
+    """Render every size in IMAGE_VARIANTS[img_type] from an uploaded file.
+
+    Returns the sha256 of the upload, which is used to build the object keys,
+    and a ``{variant: (bytes, format)}`` map.
+    """
+    image_format = get_image_format(fileobj.read(8))
+    fileobj.seek(0)
 
     if image_format == "UNKNOWN":
-        return jsonify({"message": "Unknown image format"}), 400
+        raise ValueError("Unknown image format")
+
+    check_dimensions(fileobj)
+    digest = file_digest(fileobj)
+
+    if WEBP_SUPPORTED:
+        image_format = "WEBP"
 
-    image = Image.open(BytesIO(image_data))
+    image = Image.open(fileobj)
 
     enhancer = ImageEnhance.Sharpness(image)
     image = enhancer.enhance(2)
 
     aspect_ratio = image.width / image.height
-    new_width = 800 if img_type != "profile_picture" else 400
-    new_height = int(new_width / aspect_ratio)
-    image = image.resize((new_width, new_height), Image.LANCZOS)
 
-    buffer = BytesIO()
-    image.save(buffer, format=image_format, quality=80)
-    compressed_image_data = buffer.getvalue()
+    variants = {}
+    for name, width in IMAGE_VARIANTS[img_type].items():
+        height = max(1, int(width / aspect_ratio))
+        variants[name] = _encode(
+            image.resize((width, height), Image.LANCZOS), image_format
+        )
 
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=AWS_ACCESS_KEY,
-        aws_secret_access_key=AWS_SECRET_KEY,
-    )
+    return digest, variants
 
-    file_name = f"{img_type}_{id}_{uuid.uuid4()}.{image_format.lower()}"
 
-    try:
-        s3.delete_object(Bucket=BUCKET_NAME, Key=file_name)
+def put_variants(digest: str, variants: dict, img_type: str) -> dict:
+    storage = get_storage()
 
-        cloudfront = boto3.client(
-            "cloudfront",
-            aws_access_key_id=AWS_ACCESS_KEY,
-            aws_secret_access_key=AWS_SECRET_KEY,
-        )
-        cloudfront.create_invalidation(
-            DistributionId=CLOUDFRONT_DISTRIBUTION_ID,
-            InvalidationBatch={
-                "Paths": {
-                    "Quantity": 1,
-                    "Items": [
-                        f"/{file_name}",
-                    ],
-                },
-                "CallerReference": str(datetime.now()),
-            },
-        )
+    urls = {}
+    for name, (image_data, image_format) in variants.items():
+        # Keys are derived from the upload's content hash, so an identical
+        # upload maps to objects that already exist and nothing is overwritten.
+        key = f"{img_type}/{digest}/{name}.{image_format.lower()}"
+        storage.put(key, image_data, f"image/{image_format.lower()}")
 
-    except Exception as e:
-        print(f"No existing file to delete: {e}")
+        urls[name] = storage.url(key)
 
-    try:
-        _ = s3.put_object(
-            Bucket=BUCKET_NAME,
-            Key=file_name,
-            Body=compressed_image_data,
-            ContentType="image/jpeg",
-        )
-        return f"{CLOUDFRONT_DOMAIN}/{file_name}"
-    except Exception as e:
-        return jsonify({"message": f"Error uploading file to S3: {e}"}), 400
+    return urls
+
+
+def upload_image(fileobj: BinaryIO, img_type: str) -> dict:
+    digest, variants = process_image(fileobj, img_type)
+
+    return put_variants(digest, variants, img_type)
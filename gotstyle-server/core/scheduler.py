@@ -0,0 +1,31 @@
+from apscheduler.schedulers.blocking import BlockingScheduler
+from core.blocklist import purge_expired_tokens
+from core.engagement import reconcile_counters
+from core.notifications import reconcile_unread_counts
+from core.push import purge_old_messages
+from core.timeline import trim_timelines
+
+# (job, trigger arguments). Each job runs inside its own app context.
+JOBS = [
+    (purge_expired_tokens, {"trigger": "interval", "minutes": 15}),
+    (purge_old_messages, {"trigger": "interval", "hours": 1}),
+    (trim_timelines, {"trigger": "interval", "hours": 1}),
+    (reconcile_counters, {"trigger": "cron", "hour": 4}),
+    (reconcile_unread_counts, {"trigger": "cron", "hour": 4, "minute": 30}),
+]
+
+
+def run_scheduler(app) -> None:
+    scheduler = BlockingScheduler()
+
+    for job, trigger in JOBS:
+
+        def run(job=job):
+            with app.app_context():
+                print(f"{job.__name__}: {job()}")
+
+        scheduler.add_job(
+            run, id=job.__name__, coalesce=True, max_instances=1, **trigger
+        )
+
+    scheduler.start()
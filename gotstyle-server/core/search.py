@@ -1,51 +1,132 @@
+from collections import Counter, defaultdict
 from datetime import datetime
+from sqlalchemy import func
+from db import db, insert_all
+from models import Outfit, OutfitHashtag, OutfitSearchToken, User
+import heapq
 
 
 def tokenize(text):
     return text.lower().split()
 
 
-def search_outfits_by_hashtag(outfits: list, query: str, hashtag: str) -> list:
-    query_tokens = tokenize(query)
-    search_results = []
+def outfit_tokens(description: str | None, username: str, hashtags: list) -> Counter:
+    tokens = Counter()
 
-    for outfit in outfits:
-        if hashtag not in [tag.lower() for tag in outfit["hashtags"]]:
-            continue
+    for token in tokenize(description or ""):
+        tokens[(token, "description")] += 1
 
-        score = 0
+    tokens[(username.lower(), "username")] += 2
 
-    search_results.sort(key=lambda x: x[1], reverse=True)
-    return [outfit for outfit, score in search_results]
+    for hashtag in hashtags:
+        tokens[(hashtag.lower(), "hashtag")] += 2
 
+    return tokens
 
-def search_outfits(outfits: list, query: str) -> list:
-    query_tokens = tokenize(query)
-    search_results = []
 
-    for outfit in outfits:
-        score = 0
+def index_outfit(outfit: Outfit, username: str, hashtags: list) -> None:
+    remove_outfit_from_index(outfit.id)
 
-        for token in tokenize(outfit["description"]):
-            if token in query_tokens:
-                score += 1
+    insert_all(
+        [
+            OutfitSearchToken(
+                token=token, outfit_id=outfit.id, field=field, weight=weight
+            )
+            for (token, field), weight in outfit_tokens(
+                outfit.description, username, hashtags
+            ).items()
+        ]
+    )
 
-        if outfit["user"]["username"].lower() in query_tokens:
-            score += 2
 
-        for hashtag in outfit["hashtags"]:
-            if hashtag.lower() in query_tokens:
-                score += 2
+def remove_outfit_from_index(outfit_id: str) -> None:
+    OutfitSearchToken.query.filter_by(outfit_id=outfit_id).delete()
 
-        time_factor = (datetime.now() - outfit["created_at"]).days
-        score += max(0, (30 - time_factor) / 30)
 
-        if score > 0:
-            search_results.append((outfit, score))
+def reindex_username(user_id: str, username: str) -> None:
+    outfit_ids = db.session.query(Outfit.id).filter_by(user_id=user_id)
 
-    search_results.sort(key=lambda x: x[1], reverse=True)
+    OutfitSearchToken.query.filter(
+        OutfitSearchToken.outfit_id.in_(outfit_ids.scalar_subquery()),
+        OutfitSearchToken.field == "username",
+    ).delete(synchronize_session=False)
+
+    db.session.add_all(
+        OutfitSearchToken(
+            token=username.lower(), outfit_id=outfit_id, field="username", weight=2
+        )
+        for (outfit_id,) in outfit_ids
+    )
+
+
+def rebuild_search_index(batch_size: int = 500) -> int:
+    OutfitSearchToken.query.delete()
+    indexed = 0
+    last_id = ""
+
+    while True:
+        batch = (
+            db.session.query(Outfit, User.username)
+            .join(User, User.id == Outfit.user_id)
+            .filter(Outfit.id > last_id)
+            .order_by(Outfit.id)
+            .limit(batch_size)
+            .all()
+        )
+
+        if not batch:
+            break
+
+        hashtags = defaultdict(list)
+        for outfit_id, hashtag in db.session.query(
+            OutfitHashtag.outfit_id, OutfitHashtag.hashtag
+        ).filter(OutfitHashtag.outfit_id.in_([outfit.id for outfit, _ in batch])):
+            hashtags[outfit_id].append(hashtag)
+
+        for outfit, username in batch:
+            index_outfit(outfit, username, hashtags[outfit.id])
+
+        db.session.commit()
+        indexed += len(batch)
+        last_id = batch[-1][0].id
+
+    return indexed
+
+
+def search_outfits(query: str, limit: int) -> list:
+    """Return the ids of the ``limit`` best matching outfits for ``query``.
+
+    Scores are the same as a full scan would give: one point per matching
+    description token, two per matching username or hashtag, plus a boost
+    for outfits younger than 30 days. Only outfits with at least one indexed
+    token hit are considered.
+    """
+    query_tokens = set(tokenize(query))
+
+    if not query_tokens:
+        return []
+
+    rows = (
+        db.session.query(
+            OutfitSearchToken.outfit_id,
+            func.sum(OutfitSearchToken.weight),
+            Outfit.created_at,
+        )
+        .join(Outfit, Outfit.id == OutfitSearchToken.outfit_id)
+        .filter(OutfitSearchToken.token.in_(query_tokens))
+        .group_by(OutfitSearchToken.outfit_id, Outfit.created_at)
+        .all()
+    )
+
+    now = datetime.now()
+    scored = []
 
-    return [outfit for outfit, score in search_results]
+    for outfit_id, hits, created_at in rows:
+        time_factor = (now - created_at).days
+        score = hits + max(0, (30 - time_factor) / 30)
+        scored.append((score, created_at, outfit_id))
+
+    return [outfit_id for _, _, outfit_id in heapq.nlargest(limit, scored)]
 
 
 def search_users(users: list, query: str) -> str:
@@ -0,0 +1,580 @@
+from collections import defaultdict
+from sqlalchemy import or_
+from core.fields import select_fields, subfields, wants
+from core.metrics import timed
+from db import db
+from models import (
+    User,
+    Outfit,
+    Comment,
+    CommentAnswer,
+    Follow,
+    OutfitHashtag,
+    OutfitImage,
+    OutfitLink,
+    image_variants,
+    outfit_like,
+    outfit_save,
+    comment_likes,
+    comment_reply_likes,
+)
+
+# Batched counterparts of the Model.to_dict() methods. Each serializer takes a
+# list of rows and resolves every relationship with one IN-query per relation,
+# so the number of round trips does not grow with the number of rows.
+
+
+def _unique(values) -> list:
+    return list(dict.fromkeys(value for value in values if value is not None))
+
+
+def _user_summary(user: User) -> dict:
+    return {
+        "id": user.id,
+        "username": user.username,
+        "image_url": user.image_url,
+    }
+
+
+def _user_profile(user: User) -> dict:
+    return {
+        "username": user.username,
+        "image_url": user.image_url,
+        "id": user.id,
+        "name": user.name,
+    }
+
+
+def load_users(ids) -> dict:
+    ids = _unique(ids)
+
+    if not ids:
+        return {}
+
+    return {user.id: user for user in User.query.filter(User.id.in_(ids)).all()}
+
+
+@timed("serialize")
+def serialize_user_profiles(ids: list) -> list:
+    users = load_users(ids)
+
+    return [_user_profile(users[id]) for id in ids if id in users]
+
+
+def load_association_users(table, key: str, ids) -> dict:
+    ids = _unique(ids)
+    grouped = defaultdict(list)
+
+    if not ids:
+        return grouped
+
+    rows = (
+        db.session.query(table.c[key], User)
+        .join(User, User.id == table.c.user_id)
+        .filter(table.c[key].in_(ids))
+        .all()
+    )
+
+    for entity_id, user in rows:
+        grouped[entity_id].append(user)
+
+    return grouped
+
+
+def _wants_users(fields: dict | None, name: str) -> bool:
+    """Whether ``fields`` asks for the users behind the ``name`` counter,
+    ``likes.count`` alone is served from the denormalized count."""
+    return wants(fields, name) and wants(subfields(fields, name), "users")
+
+
+def _load_follow_users(key_column, user_column, user_ids) -> dict:
+    user_ids = _unique(user_ids)
+    grouped = defaultdict(list)
+
+    if not user_ids:
+        return grouped
+
+    rows = (
+        db.session.query(key_column, User)
+        .join(User, User.id == user_column)
+        .filter(key_column.in_(user_ids), Follow.status == "Accepted")
+        .all()
+    )
+
+    for user_id, user in rows:
+        grouped[user_id].append(user)
+
+    return grouped
+
+
+def load_followers(user_ids) -> dict:
+    return _load_follow_users(Follow.followee_id, Follow.follower_id, user_ids)
+
+
+def load_following(user_ids) -> dict:
+    return _load_follow_users(Follow.follower_id, Follow.followee_id, user_ids)
+
+
+def _load_association_outfits(table, user_ids) -> dict:
+    user_ids = _unique(user_ids)
+    grouped = defaultdict(list)
+
+    if not user_ids:
+        return grouped
+
+    rows = (
+        db.session.query(table.c.user_id, Outfit)
+        .join(Outfit, Outfit.id == table.c.outfit_id)
+        .filter(table.c.user_id.in_(user_ids))
+        .all()
+    )
+
+    for user_id, outfit in rows:
+        grouped[user_id].append(outfit)
+
+    return grouped
+
+
+def _load_children(model, foreign_key: str, ids, *criteria) -> dict:
+    ids = _unique(ids)
+    grouped = defaultdict(list)
+
+    if not ids:
+        return grouped
+
+    column = getattr(model, foreign_key)
+
+    for row in model.query.filter(column.in_(ids), *criteria).all():
+        grouped[getattr(row, foreign_key)].append(row)
+
+    return grouped
+
+
+@timed("serialize")
+def serialize_comment_answers(answers: list) -> list:
+    if not answers:
+        return []
+
+    user_ids = [a.user_id for a in answers] + [a.commenter_id for a in answers]
+    usernames = _unique(a.reply_to_username for a in answers)
+
+    users = (
+        User.query.filter(
+            or_(User.id.in_(_unique(user_ids)), User.username.in_(usernames))
+        ).all()
+        if user_ids or usernames
+        else []
+    )
+    users_by_id = {user.id: user for user in users}
+    users_by_username = {user.username: user for user in users}
+
+    likes = load_association_users(
+        comment_reply_likes, "comment_answer_id", [a.id for a in answers]
+    )
+
+    results = []
+    for answer in answers:
+        reply_to_user = users_by_username.get(answer.reply_to_username)
+
+        results.append(
+            {
+                "id": answer.id,
+                "text": answer.text,
+                "user_id": answer.user_id,
+                "comment_id": answer.comment_id,
+                "created_at": answer.created_at,
+                "reply_to_username": answer.reply_to_username,
+                "user": _user_profile(users_by_id[answer.user_id]),
+                "commenter": _user_profile(users_by_id[answer.commenter_id]),
+                "likes": [_user_summary(user) for user in likes[answer.id]],
+                "reply_to_user": (
+                    _user_profile(reply_to_user) if reply_to_user else None
+                ),
+            }
+        )
+
+    return results
+
+
+@timed("serialize")
+def serialize_comments(comments: list) -> list:
+    if not comments:
+        return []
+
+    comment_ids = [comment.id for comment in comments]
+
+    users = load_users(comment.user_id for comment in comments)
+    likes = load_association_users(comment_likes, "comment_id", comment_ids)
+
+    answers = _load_children(CommentAnswer, "comment_id", comment_ids)
+    serialized_answers = serialize_comment_answers(
+        [answer for comment_id in answers for answer in answers[comment_id]]
+    )
+    answers_by_comment = defaultdict(list)
+    for answer in serialized_answers:
+        answers_by_comment[answer["comment_id"]].append(answer)
+
+    return [
+        {
+            "id": comment.id,
+            "text": comment.text,
+            "user_id": comment.user_id,
+            "outfit_id": comment.outfit_id,
+            "created_at": comment.created_at,
+            "likes": [_user_summary(user) for user in likes[comment.id]],
+            "user": _user_profile(users[comment.user_id]),
+            "answers": answers_by_comment[comment.id],
+        }
+        for comment in comments
+    ]
+
+
+@timed("serialize")
+def serialize_outfits(outfits: list, fields: dict | None = None) -> list:
+    """Serialize ``outfits``, loading only the relations named in ``fields``
+    (see core.fields) or all of them when no fieldset is given."""
+    if not outfits:
+        return []
+
+    outfit_ids = [outfit.id for outfit in outfits]
+    user_fields = subfields(fields, "user")
+
+    owners = (
+        load_users(outfit.user_id for outfit in outfits)
+        if wants(fields, "user")
+        else {}
+    )
+    followers = (
+        load_followers(owners.keys())
+        if owners and wants(user_fields, "followers")
+        else {}
+    )
+
+    likes = saves = hashtags = images = links = defaultdict(list)
+    if _wants_users(fields, "likes"):
+        likes = load_association_users(outfit_like, "outfit_id", outfit_ids)
+    if _wants_users(fields, "saves"):
+        saves = load_association_users(outfit_save, "outfit_id", outfit_ids)
+    if wants(fields, "hashtags"):
+        hashtags = _load_children(OutfitHashtag, "outfit_id", outfit_ids)
+    if wants(fields, "outfit_images"):
+        images = _load_children(OutfitImage, "outfit_id", outfit_ids)
+    if wants(fields, "links"):
+        links = _load_children(OutfitLink, "outfit_id", outfit_ids)
+
+    comments_by_outfit = defaultdict(list)
+    if wants(fields, "comments"):
+        comments = _load_children(Comment, "outfit_id", outfit_ids)
+        serialized_comments = serialize_comments(
+            [comment for outfit_id in comments for comment in comments[outfit_id]]
+        )
+        for comment in serialized_comments:
+            comments_by_outfit[comment["outfit_id"]].append(comment)
+
+    results = []
+    for outfit in outfits:
+        result = _outfit_payload(
+            outfit,
+            likes[outfit.id],
+            saves[outfit.id],
+            comments_by_outfit[outfit.id],
+            hashtags[outfit.id],
+            images[outfit.id],
+            links[outfit.id],
+        )
+
+        if owners:
+            owner = owners[outfit.user_id]
+            result["user"] = _outfit_owner(owner, followers.get(owner.id, []))
+
+        results.append(select_fields(result, fields))
+
+    return results
+
+
+@timed("serialize")
+def serialize_new_outfit(
+    outfit: Outfit, owner: User, hashtags: list, images: list, links: list
+) -> dict:
+    """Serialize an outfit created by this request from the rows it inserted,
+    a new outfit has no likes, saves or comments to load."""
+    result = _outfit_payload(outfit, [], [], [], hashtags, images, links)
+    result["user"] = _outfit_owner(owner, load_followers([owner.id])[owner.id])
+
+    return result
+
+
+def _outfit_payload(
+    outfit: Outfit,
+    likes: list,
+    saves: list,
+    comments: list,
+    hashtags: list,
+    images: list,
+    links: list,
+) -> dict:
+    # The counters are unset on an outfit created by this request, insert_all
+    # only fills their defaults in the inserted row.
+    return {
+        "id": outfit.id,
+        "photo_url": outfit.photo_url,
+        "shoes_url": outfit.shoes_url,
+        "video_url": outfit.video_url,
+        "user_id": outfit.user_id,
+        "created_at": outfit.created_at,
+        "likes": {
+            "count": outfit.like_count or 0,
+            "users": [_user_summary(user) for user in likes],
+        },
+        "saves": {
+            "count": outfit.save_count or 0,
+            "users": [_user_summary(user) for user in saves],
+        },
+        "comments": comments,
+        "updated_at": outfit.updated_at,
+        "description": outfit.description,
+        "hashtags": [hashtag.hashtag for hashtag in hashtags],
+        "style": outfit.style,
+        "outfit_images": [image.to_dict() for image in images],
+        "links": [link.to_dict() for link in links],
+    }
+
+
+def _outfit_owner(owner: User, followers: list) -> dict:
+    return {
+        "username": owner.username,
+        "image_url": owner.image_url,
+        "id": owner.id,
+        "color": owner.color,
+        "is_private": owner.is_private,
+        "followers": [_user_summary(user) for user in followers],
+    }
+
+
+def _outfit_preview(outfit: Outfit, owner: User) -> dict:
+    return {
+        "id": outfit.id,
+        "photo_url": outfit.photo_url,
+        "shoes_url": outfit.shoes_url,
+        "video_url": outfit.video_url,
+        "user_id": outfit.user_id,
+        "created_at": outfit.created_at,
+        "user": {
+            "username": owner.username,
+            "image_url": owner.image_url,
+            "id": owner.id,
+            "color": owner.color,
+        },
+    }
+
+
+@timed("serialize")
+def serialize_users(users: list, fields: dict | None = None) -> list:
+    """Serialize ``users``, loading only the relations named in ``fields``
+    (see core.fields) or all of them when no fieldset is given."""
+    if not users:
+        return []
+
+    user_ids = [user.id for user in users]
+
+    followers = following = pending = defaultdict(list)
+    if wants(fields, "followers"):
+        followers = load_followers(user_ids)
+    if wants(fields, "following"):
+        following = load_following(user_ids)
+    if wants(fields, "pending_follows"):
+        pending = _load_children(
+            Follow, "followee_id", user_ids, Follow.status == "Pending"
+        )
+
+    outfits_by_user = defaultdict(list)
+    if wants(fields, "outfits"):
+        outfits = _load_children(Outfit, "user_id", user_ids)
+        owned = sorted(
+            (outfit for user_id in outfits for outfit in outfits[user_id]),
+            key=lambda outfit: outfit.created_at,
+            reverse=True,
+        )
+        serialized_outfits = serialize_outfits(owned, subfields(fields, "outfits"))
+        for outfit, serialized in zip(owned, serialized_outfits):
+            outfits_by_user[outfit.user_id].append(serialized)
+
+    liked = saved = defaultdict(list)
+    if wants(fields, "liked_outfits"):
+        liked = _load_association_outfits(outfit_like, user_ids)
+    if wants(fields, "saved_outfits"):
+        saved = _load_association_outfits(outfit_save, user_ids)
+
+    liked_ids = [outfit.id for user_id in liked for outfit in liked[user_id]]
+    liked_fields = subfields(fields, "liked_outfits")
+    owners = load_users(
+        outfit.user_id
+        for collection in (liked, saved)
+        for user_id in collection
+        for outfit in collection[user_id]
+    )
+
+    liked_likes = liked_saves = comments_by_outfit = defaultdict(list)
+    if _wants_users(liked_fields, "likes"):
+        liked_likes = load_association_users(outfit_like, "outfit_id", liked_ids)
+    if _wants_users(liked_fields, "saves"):
+        liked_saves = load_association_users(outfit_save, "outfit_id", liked_ids)
+    if wants(liked_fields, "comments"):
+        liked_comments = _load_children(Comment, "outfit_id", liked_ids)
+        serialized_comments = serialize_comments(
+            [c for outfit_id in liked_comments for c in liked_comments[outfit_id]]
+        )
+        comments_by_outfit = defaultdict(list)
+        for comment in serialized_comments:
+            comments_by_outfit[comment["outfit_id"]].append(comment)
+
+    results = []
+    for user in users:
+        result = {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "created_at": user.created_at,
+            "image_url": user.image_url,
+            "image_variants": image_variants(user.image_variants, user.image_url),
+            "bio": user.bio,
+            "updated_at": user.updated_at,
+            "outfits": outfits_by_user[user.id],
+            "color": user.color,
+            "name": user.name,
+            "sex": user.sex,
+            "liked_outfits": [
+                {
+                    **_outfit_preview(outfit, owners[outfit.user_id]),
+                    "likes": {
+                        "count": outfit.like_count,
+                        "users": [_user_summary(u) for u in liked_likes[outfit.id]],
+                    },
+                    "saves": {
+                        "count": outfit.save_count,
+                        "users": [_user_summary(u) for u in liked_saves[outfit.id]],
+                    },
+                    "comments": comments_by_outfit[outfit.id],
+                }
+                for outfit in liked[user.id]
+            ],
+            "saved_outfits": [
+                _outfit_preview(outfit, owners[outfit.user_id])
+                for outfit in saved[user.id]
+            ],
+            "followers": [_user_summary(u) for u in followers[user.id]],
+            "following": [_user_summary(u) for u in following[user.id]],
+            "pending_follows": [
+                {"id": follow.follower_id, "status": follow.status}
+                for follow in pending[user.id]
+            ],
+            "is_private": user.is_private,
+            "streak": user.streak,
+            "expo_push_token": user.expo_push_token,
+            "last_upload_time": user.last_upload_time,
+            "verified": user.verified,
+        }
+
+        results.append(select_fields(result, fields))
+
+    return results
+
+
+def _load_by_id(model, ids) -> list:
+    ids = _unique(ids)
+
+    if not ids:
+        return []
+
+    return model.query.filter(model.id.in_(ids)).all()
+
+
+def _notification_entities(notifications: list) -> dict:
+    """Compact previews of the notified entities, enough to render the inbox
+    row and link to the full outfit or comment."""
+    entity_ids = defaultdict(list)
+    for notification in notifications:
+        entity_ids[notification.entity_type].append(notification.entity_id)
+
+    entities = {}
+
+    comments = _load_by_id(Comment, entity_ids["comment"])
+    answers = []
+    if entity_ids["comment_answer"]:
+        answers = (
+            db.session.query(CommentAnswer, Comment.outfit_id)
+            .join(Comment, Comment.id == CommentAnswer.comment_id)
+            .filter(CommentAnswer.id.in_(_unique(entity_ids["comment_answer"])))
+            .all()
+        )
+
+    outfits = _load_by_id(Outfit, entity_ids["outfit"])
+    images = _load_children(
+        OutfitImage,
+        "outfit_id",
+        [outfit.id for outfit in outfits],
+        OutfitImage.status == "Ready",
+    )
+
+    for outfit in outfits:
+        image = images[outfit.id][0] if images[outfit.id] else None
+        entities[("outfit", outfit.id)] = {
+            "id": outfit.id,
+            "user_id": outfit.user_id,
+            "photo_url": outfit.photo_url,
+            "description": outfit.description,
+            "created_at": outfit.created_at,
+            "image": image.to_dict() if image else None,
+        }
+
+    for comment in comments:
+        entities[("comment", comment.id)] = {
+            "id": comment.id,
+            "outfit_id": comment.outfit_id,
+            "user_id": comment.user_id,
+            "text": comment.text,
+            "created_at": comment.created_at,
+        }
+
+    for answer, outfit_id in answers:
+        entities[("comment_answer", answer.id)] = {
+            "id": answer.id,
+            "comment_id": answer.comment_id,
+            "outfit_id": outfit_id,
+            "user_id": answer.user_id,
+            "text": answer.text,
+            "created_at": answer.created_at,
+        }
+
+    return entities
+
+
+@timed("serialize")
+def serialize_notifications(notifications: list) -> list:
+    if not notifications:
+        return []
+
+    entities = _notification_entities(notifications)
+
+    users = load_users(
+        user_id
+        for notification in notifications
+        for user_id in (notification.user_id, notification.sender_id)
+    )
+
+    return [
+        {
+            "id": notification.id,
+            "user_id": notification.user_id,
+            "action_type": notification.action_type,
+            "entity_id": notification.entity_id,
+            "entity_type": notification.entity_type,
+            "is_read": notification.is_read,
+            "created_at": notification.created_at,
+            "actor_count": notification.actor_count,
+            "user": _user_profile(users[notification.user_id]),
+            "entity": entities.get((notification.entity_type, notification.entity_id)),
+            "sender": _user_profile(users[notification.sender_id]),
+        }
+        for notification in notifications
+    ]
@@ -0,0 +1,196 @@
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import chain
+from db import db
+from models import Follow
+import heapq
+import threading
+import time
+
+# Accepted follows made or accepted by other processes show up this many
+# seconds later.
+REFRESH_INTERVAL = 5
+# Rows are fetched from a little before the previous refresh so a follow whose
+# transaction committed late is not missed.
+REFRESH_OVERLAP = timedelta(seconds=30)
+# Unfollows by other processes are only picked up by a full rebuild.
+REBUILD_INTERVAL = 10 * 60
+
+# A mutual follow outranks a one-way follow, which outranks any number of
+# shared connections: friend-of-friend paths add FRIEND_OF_FRIEND each and
+# are capped so they never add up to a direct follow.
+MUTUAL = 2
+ONE_WAY = 1
+FRIEND_OF_FRIEND = 0.1
+FRIEND_OF_FRIEND_CAP = 9
+
+
+class FollowGraph:
+    """In-process adjacency lists of the accepted-follow graph.
+
+    User ids are mapped to dense integers and every user keeps an unsigned
+    int array of the users they follow and of their followers, which is a
+    few bytes per edge instead of a Follow row or a Python set entry.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        # Follows applied while a refresh queries the database, replayed onto
+        # its result since the query may not see them.
+        self.pending = None
+        self.index = {}
+        self.ids = []
+        self.following = []
+        self.followers = []
+        self.refreshed_at = None
+        self.next_refresh = 0
+        self.next_rebuild = 0
+
+    def _node(self, user_id: str) -> int:
+        node = self.index.get(user_id)
+
+        if node is None:
+            node = self.index[user_id] = len(self.ids)
+            self.ids.append(user_id)
+            self.following.append(array("I"))
+            self.followers.append(array("I"))
+
+        return node
+
+    def _add(self, follower_id: str, followee_id: str) -> None:
+        follower = self._node(follower_id)
+        followee = self._node(followee_id)
+
+        if followee not in self.following[follower]:
+            self.following[follower].append(followee)
+            self.followers[followee].append(follower)
+
+    def _remove(self, follower_id: str, followee_id: str) -> None:
+        follower = self.index.get(follower_id)
+        followee = self.index.get(followee_id)
+
+        if follower is None or followee is None:
+            return
+
+        if followee in self.following[follower]:
+            self.following[follower].remove(followee)
+            self.followers[followee].remove(follower)
+
+    def _refresh(self) -> None:
+        """Query accepted follows without holding the lock and apply them
+        under it. A rebuild fills a new graph that replaces the current one."""
+        rebuild = self.refreshed_at is None or time.monotonic() >= self.next_rebuild
+        started_at = datetime.utcnow()
+        query = db.session.query(Follow.follower_id, Follow.followee_id).filter(
+            Follow.status == "Accepted"
+        )
+
+        if not rebuild:
+            query = query.filter(
+                Follow.updated_at >= self.refreshed_at - REFRESH_OVERLAP
+            )
+
+        with self.lock:
+            self.pending = []
+
+        if rebuild:
+            graph = FollowGraph()
+
+            for follower_id, followee_id in query.yield_per(10_000):
+                graph._add(follower_id, followee_id)
+        else:
+            rows = query.all()
+
+        with self.lock:
+            if rebuild:
+                self.index = graph.index
+                self.ids = graph.ids
+                self.following = graph.following
+                self.followers = graph.followers
+                self.next_rebuild = time.monotonic() + REBUILD_INTERVAL
+            else:
+                for follower_id, followee_id in rows:
+                    self._add(follower_id, followee_id)
+
+            for apply, follower_id, followee_id in self.pending:
+                apply(follower_id, followee_id)
+
+            self.pending = None
+            self.refreshed_at = started_at
+            self.next_refresh = time.monotonic() + REFRESH_INTERVAL
+
+    def follow(self, follower_id: str, followee_id: str) -> None:
+        """Apply a committed accepted follow without waiting for a refresh."""
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((self._add, follower_id, followee_id))
+
+            if self.refreshed_at is not None:
+                self._add(follower_id, followee_id)
+
+    def unfollow(self, follower_id: str, followee_id: str) -> None:
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((self._remove, follower_id, followee_id))
+
+            if self.refreshed_at is not None:
+                self._remove(follower_id, followee_id)
+
+    def scores(self, user_id: str) -> list:
+        """Return ``[(score, user id)]`` for everyone connected to ``user_id``
+        directly or through someone they follow."""
+        # One request refreshes while the others keep reading the current
+        # graph, only the very first load is waited for.
+        if time.monotonic() >= self.next_refresh and self.refresh_lock.acquire(
+            blocking=self.refreshed_at is None
+        ):
+            try:
+                if time.monotonic() >= self.next_refresh:
+                    self._refresh()
+            finally:
+                self.refresh_lock.release()
+
+        with self.lock:
+            node = self.index.get(user_id)
+
+            if node is None:
+                return []
+
+            following = set(self.following[node])
+            followers = set(self.followers[node])
+
+            # One C-level pass over the concatenated adjacency arrays of
+            # everyone the user follows counts the two-hop paths to each user.
+            paths = Counter(
+                chain.from_iterable(self.following[other] for other in following)
+            )
+            ids = self.ids
+
+        scores = {
+            other: FRIEND_OF_FRIEND * min(count, FRIEND_OF_FRIEND_CAP)
+            for other, count in paths.items()
+        }
+
+        for other in following ^ followers:
+            scores[other] = scores.get(other, 0) + ONE_WAY
+
+        for other in following & followers:
+            scores[other] = scores.get(other, 0) + MUTUAL
+
+        scores.pop(node, None)
+
+        return [(round(score, 1), ids[other]) for other, score in scores.items()]
+
+
+def top_scores(scores: list, limit: int, after: tuple | None = None) -> list:
+    """Highest ``limit`` of ``scores`` ranked by score, then id, descending,
+    skipping everything up to and including ``after``."""
+    if after is not None:
+        scores = [entry for entry in scores if entry < after]
+
+    return heapq.nlargest(limit, scores)
+
+
+follow_graph = FollowGraph()
@@ -0,0 +1,169 @@
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from abc import ABC, abstractmethod
+from boto3.s3.transfer import TransferConfig
+from io import BytesIO
+from core.config import (
+    AWS_ACCESS_KEY,
+    AWS_SECRET_KEY,
+    BUCKET_NAME,
+    CLOUDFRONT_DOMAIN,
+    LOCAL_STORAGE_DIR,
+    LOCAL_STORAGE_URL,
+    STORAGE_BACKEND,
+)
+from core.metrics import timed
+import boto3
+import os
+import shutil
+import threading
+
+# Bodies above this size are uploaded in parts of the same size.
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(service: str):
+    """Return a process-wide boto3 client for ``service``.
+
+    boto3 clients are thread safe and keep their own connection pool, so they
+    are created once per process instead of once per upload.
+    """
+    client = _clients.get(service)
+
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(service)
+
+            if client is None:
+                client = boto3.client(
+                    service,
+                    aws_access_key_id=AWS_ACCESS_KEY,
+                    aws_secret_access_key=AWS_SECRET_KEY,
+                    config=Config(
+                        max_pool_connections=20, retries={"mode": "standard"}
+                    ),
+                )
+                _clients[service] = client
+
+    return client
+
+
+def _as_file(data):
+    return BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+
+
+class Storage(ABC):
+    @abstractmethod
+    def exists(self, key: str) -> bool: ...
+
+    @abstractmethod
+    def write(self, key: str, fileobj, content_type: str) -> None: ...
+
+    @abstractmethod
+    def url(self, key: str) -> str: ...
+
+    def put(self, key: str, data, content_type: str) -> None:
+        """Store ``data`` (bytes or a binary file object) under ``key``.
+
+        Keys are content-addressed, so an existing object already holds the
+        same bytes and is left alone.
+        """
+        if not self.exists(key):
+            self.write(key, _as_file(data), content_type)
+
+
+class S3Storage(Storage):
+    transfer_config = TransferConfig(
+        multipart_threshold=MULTIPART_CHUNK_SIZE,
+        multipart_chunksize=MULTIPART_CHUNK_SIZE,
+    )
+
+    def exists(self, key: str) -> bool:
+        try:
+            with timed("s3"):
+                get_client("s3").head_object(Bucket=BUCKET_NAME, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                return False
+            raise
+
+        return True
+
+    @timed("s3")
+    def write(self, key: str, fileobj, content_type: str) -> None:
+        get_client("s3").upload_fileobj(
+            fileobj,
+            BUCKET_NAME,
+            key,
+            ExtraArgs={
+                "ContentType": content_type,
+                "CacheControl": "public, max-age=31536000, immutable",
+            },
+            Config=self.transfer_config,
+        )
+
+    def url(self, key: str) -> str:
+        return f"{CLOUDFRONT_DOMAIN}/{key}"
+
+
+class LocalStorage(Storage):
+    def __init__(self, root: str, base_url: str):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def write(self, key: str, fileobj, content_type: str) -> None:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, "wb") as f:
+            shutil.copyfileobj(fileobj, f, MULTIPART_CHUNK_SIZE)
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+
+class MemoryStorage(Storage):
+    def __init__(self, base_url: str = "memory://storage"):
+        self.base_url = base_url.rstrip("/")
+        self.objects = {}
+
+    def exists(self, key: str) -> bool:
+        return key in self.objects
+
+    def write(self, key: str, fileobj, content_type: str) -> None:
+        self.objects[key] = (fileobj.read(), content_type)
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+
+_storage = None
+
+
+def get_storage() -> Storage:
+    global _storage
+
+    if _storage is None:
+        if STORAGE_BACKEND == "local":
+            _storage = LocalStorage(LOCAL_STORAGE_DIR, LOCAL_STORAGE_URL)
+        elif STORAGE_BACKEND == "memory":
+            _storage = MemoryStorage()
+        else:
+            _storage = S3Storage()
+
+    return _storage
+
+
+def set_storage(storage: Storage) -> None:
+    global _storage
+
+    _storage = storage
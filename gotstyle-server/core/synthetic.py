@@ -0,0 +1,369 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import accumulate
+from sqlalchemy import func, select
+from werkzeug.security import generate_password_hash
+from core.engagement import reconcile_counters
+from core.hashtags import normalize_hashtag
+from core.notifications import reconcile_unread_counts
+from core.search import outfit_tokens
+from core.timeline import COLUMNS, TIMELINE_LENGTH, timeline_entry
+from db import db
+from models import (
+    Comment,
+    CommentAnswer,
+    Follow,
+    HashtagDailyCount,
+    Notification,
+    Outfit,
+    OutfitHashtag,
+    OutfitImage,
+    OutfitSearchToken,
+    User,
+    comment_likes as comment_like,
+    comment_reply_likes as comment_reply_like,
+    outfit_like,
+    outfit_save,
+)
+import random
+import uuid
+
+# Popularity follows Zipf's law: the k-th most popular user gets 1 / k**ZIPF
+# of the attention of the most popular one. Per-row counts (follows, likes,
+# comments...) are Pareto distributed with the requested mean, capped so one
+# row cannot dominate a small dataset.
+ZIPF = 1.1
+PARETO_ALPHA = 1.5
+
+WORDS = (
+    "red blue black white green beige denim leather linen wool vintage street "
+    "minimal oversized summer winter autumn spring casual formal sporty chic "
+    "boho preppy grunge retro jacket coat dress skirt jeans sneakers boots "
+    "loafers hoodie blazer shirt tee knit scarf hat bag"
+).split()
+HASHTAGS = [f"#{word}" for word in WORDS] + ["#ootd", "#fit", "#style", "#lookbook"]
+STYLES = ["casual", "formal", "street", "sporty", "vintage", "minimal"]
+
+
+class Generator:
+    def __init__(self, seed: int, batch_size: int):
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        # Midnight, so reruns on the same day produce identical rows.
+        self.now = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def uuid(self) -> str:
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def count(self, mean: float, cap: int) -> int:
+        """Pareto distributed count with the given mean."""
+        if mean <= 0:
+            return 0
+
+        scale = mean * (PARETO_ALPHA - 1)
+        value = (self.random.paretovariate(PARETO_ALPHA) - 1) * scale
+
+        return min(cap, int(value + self.random.random()))
+
+    def zipf_weights(self, n: int) -> list:
+        """Cumulative Zipf weights over ``n`` ranks, for random.choices."""
+        return list(accumulate(1 / (rank + 1) ** ZIPF for rank in range(n)))
+
+    def pick(self, population: list, cum_weights: list, k: int) -> list:
+        k = min(k, len(population))
+        picked = set()
+
+        # Sampling with replacement first keeps the skew, the top-up draws
+        # only matter for the few rows that ask for most of the population.
+        for _ in range(4):
+            if len(picked) >= k:
+                break
+
+            picked.update(
+                self.random.choices(
+                    population, cum_weights=cum_weights, k=k - len(picked)
+                )
+            )
+
+        # Sorted, so the draws that follow do not depend on set order.
+        return sorted(picked)
+
+    def past(self, days: int) -> datetime:
+        return self.now - timedelta(seconds=self.random.uniform(0, days * 86400))
+
+    def insert(self, table, rows) -> int:
+        batch = []
+        inserted = 0
+
+        for row in rows:
+            batch.append(row)
+
+            if len(batch) >= self.batch_size:
+                db.session.execute(table.insert(), batch)
+                db.session.commit()
+                inserted += len(batch)
+                batch = []
+
+        if batch:
+            db.session.execute(table.insert(), batch)
+            db.session.commit()
+            inserted += len(batch)
+
+        return inserted
+
+
+def seed_database(
+    users: int,
+    outfits: int,
+    follows: float = 30,
+    likes: float = 8,
+    saves: float = 2,
+    comments: float = 1.5,
+    answers: float = 0.5,
+    comment_likes: float = 1,
+    notifications: float = 0.3,
+    days: int = 365,
+    seed: int = 1,
+    batch_size: int = 5000,
+) -> dict:
+    """Fill an empty database with a synthetic social graph.
+
+    ``users`` and ``outfits`` are totals, the other counts are means per
+    follower, per outfit (likes, saves, comments), per comment (answers) or
+    per comment and answer (comment_likes), and ``notifications`` is the
+    share of likes that left one. Everything is derived from ``seed``, so the
+    same arguments always produce the same dataset. Returns the number of rows written per table.
+    """
+    gen = Generator(seed, batch_size)
+    counts = Counter()
+    password = generate_password_hash("benchmark")
+
+    user_ids = [gen.uuid() for _ in range(users)]
+    usernames = {user_id: f"user{i}" for i, user_id in enumerate(user_ids)}
+    # user_ids is ordered by popularity, activity (who posts, likes and
+    # follows) gets its own order.
+    popularity = gen.zipf_weights(users)
+    active_ids = user_ids[:]
+    gen.random.shuffle(active_ids)
+
+    counts["user"] = gen.insert(
+        User.__table__,
+        (
+            {
+                "id": user_id,
+                "username": usernames[user_id],
+                "email": f"{usernames[user_id]}@example.com",
+                "password": password,
+                "name": f"User {i}",
+                "color": "#%06x" % gen.random.getrandbits(24),
+                "is_private": gen.random.random() < 0.1,
+                "created_at": gen.past(days),
+                "updated_at": gen.now,
+                "streak": 0,
+                "verified": False,
+            }
+            for i, user_id in enumerate(user_ids)
+        ),
+    )
+
+    def follow_rows():
+        for follower_id in active_ids:
+            for followee_id in gen.pick(
+                user_ids, popularity, gen.count(follows, users // 2)
+            ):
+                if followee_id != follower_id:
+                    created_at = gen.past(days)
+                    yield {
+                        "id": gen.uuid(),
+                        "follower_id": follower_id,
+                        "followee_id": followee_id,
+                        "status": (
+                            "Accepted" if gen.random.random() < 0.95 else "Pending"
+                        ),
+                        "created_at": created_at,
+                        "updated_at": created_at,
+                    }
+
+    counts["follow"] = gen.insert(Follow.__table__, follow_rows())
+
+    # Popular accounts also post more.
+    outfit_rows = [
+        {
+            "id": gen.uuid(),
+            "user_id": author_id,
+            "description": " ".join(gen.random.sample(WORDS, 4)),
+            "style": gen.random.choice(STYLES),
+            "created_at": gen.past(days),
+            "updated_at": gen.now,
+        }
+        for author_id in gen.random.choices(user_ids, cum_weights=popularity, k=outfits)
+    ]
+    counts["outfit"] = gen.insert(Outfit.__table__, outfit_rows)
+
+    outfit_hashtags = {
+        outfit["id"]: gen.random.sample(HASHTAGS, gen.random.randint(0, 4))
+        for outfit in outfit_rows
+    }
+    counts["outfit_hashtag"] = gen.insert(
+        OutfitHashtag.__table__,
+        (
+            {
+                "id": gen.uuid(),
+                "outfit_id": outfit_id,
+                "hashtag": hashtag,
+                "normalized": normalize_hashtag(hashtag),
+            }
+            for outfit_id, hashtags in outfit_hashtags.items()
+            for hashtag in hashtags
+        ),
+    )
+
+    daily = Counter(
+        (outfit["created_at"].date(), normalize_hashtag(hashtag))
+        for outfit in outfit_rows
+        for hashtag in outfit_hashtags[outfit["id"]]
+    )
+    counts["hashtag_daily_count"] = gen.insert(
+        HashtagDailyCount.__table__,
+        ({"day": day, "hashtag": tag, "count": n} for (day, tag), n in daily.items()),
+    )
+
+    counts["outfit_image"] = gen.insert(
+        OutfitImage.__table__,
+        (
+            {
+                "id": gen.uuid(),
+                "outfit_id": outfit["id"],
+                "image_url": f"https://example.com/outfits/{outfit['id']}/{i}.jpg",
+                "status": "Ready",
+            }
+            for outfit in outfit_rows
+            for i in range(1 + gen.count(0.5, 4))
+        ),
+    )
+
+    counts["outfit_search_token"] = gen.insert(
+        OutfitSearchToken.__table__,
+        (
+            {"token": token, "outfit_id": outfit["id"], "field": field, "weight": n}
+            for outfit in outfit_rows
+            for (token, field), n in outfit_tokens(
+                outfit["description"],
+                usernames[outfit["user_id"]],
+                outfit_hashtags[outfit["id"]],
+            ).items()
+        ),
+    )
+
+    activity = gen.zipf_weights(users)
+    liked = []
+
+    def engagement_rows(table: str, mean: float):
+        for outfit in outfit_rows:
+            for user_id in gen.pick(active_ids, activity, gen.count(mean, users)):
+                if (
+                    table == "like"
+                    and user_id != outfit["user_id"]
+                    and gen.random.random() < notifications
+                ):
+                    liked.append((outfit, user_id))
+
+                yield {"outfit_id": outfit["id"], "user_id": user_id}
+
+    counts["outfit_like"] = gen.insert(outfit_like, engagement_rows("like", likes))
+    counts["outfit_save"] = gen.insert(outfit_save, engagement_rows("save", saves))
+
+    comment_rows = [
+        {
+            "id": gen.uuid(),
+            "text": " ".join(gen.random.sample(WORDS, 3)),
+            "user_id": user_id,
+            "outfit_id": outfit["id"],
+            "created_at": outfit["created_at"] + timedelta(minutes=i + 1),
+            "updated_at": gen.now,
+        }
+        for outfit in outfit_rows
+        for i in range(gen.count(comments, 200))
+        for user_id in gen.random.choices(active_ids, cum_weights=activity, k=1)
+    ]
+    counts["comment"] = gen.insert(Comment.__table__, comment_rows)
+
+    answer_rows = [
+        {
+            "id": gen.uuid(),
+            "text": " ".join(gen.random.sample(WORDS, 3)),
+            "user_id": user_id,
+            "comment_id": comment["id"],
+            "commenter_id": comment["user_id"],
+            "reply_to_username": usernames[comment["user_id"]],
+            "created_at": comment["created_at"] + timedelta(minutes=i + 1),
+            "updated_at": gen.now,
+        }
+        for comment in comment_rows
+        for i in range(gen.count(answers, 50))
+        for user_id in gen.random.choices(active_ids, cum_weights=activity, k=1)
+    ]
+    counts["comment_answer"] = gen.insert(CommentAnswer.__table__, answer_rows)
+
+    def comment_like_rows(rows: list, key: str):
+        for row in rows:
+            for user_id in gen.pick(
+                active_ids, activity, gen.count(comment_likes, users)
+            ):
+                yield {key: row["id"], "user_id": user_id}
+
+    counts["comment_like"] = gen.insert(
+        comment_like, comment_like_rows(comment_rows, "comment_id")
+    )
+    counts["comment_reply_like"] = gen.insert(
+        comment_reply_like, comment_like_rows(answer_rows, "comment_answer_id")
+    )
+
+    counts["notification"] = gen.insert(
+        Notification.__table__,
+        (
+            {
+                "id": gen.uuid(),
+                "user_id": outfit["user_id"],
+                "sender_id": user_id,
+                "action_type": "like",
+                "entity_id": outfit["id"],
+                "entity_type": "outfit",
+                "is_read": gen.random.random() < 0.5,
+                "created_at": gen.past(days),
+                "actor_count": 1,
+            }
+            for outfit, user_id in liked
+        ),
+    )
+
+    # Timelines are built set-wise and capped with a window function, one
+    # backfill per follow would take hours at the larger scales.
+    entries = (
+        select(
+            Follow.follower_id.label("user_id"),
+            Outfit.id.label("outfit_id"),
+            Outfit.user_id.label("author_id"),
+            Outfit.created_at.label("created_at"),
+            func.row_number()
+            .over(partition_by=Follow.follower_id, order_by=Outfit.created_at.desc())
+            .label("position"),
+        )
+        .join(Outfit, Outfit.user_id == Follow.followee_id)
+        .where(Follow.status == "Accepted")
+        .subquery()
+    )
+    counts["timeline_entry"] = db.session.execute(
+        timeline_entry.insert().from_select(
+            COLUMNS,
+            select(*(entries.c[column] for column in COLUMNS)).where(
+                entries.c.position <= TIMELINE_LENGTH
+            ),
+        )
+    ).rowcount
+    db.session.commit()
+
+    reconcile_counters()
+    reconcile_unread_counts()
+
+    return dict(counts)
@@ -0,0 +1,121 @@
+from sqlalchemy import func, literal, select
+from db import UUIDKey, db
+from models import Follow, Outfit, TimelineEntry
+
+# Number of entries kept per timeline, older entries are dropped by
+# trim_timeline()/trim_timelines().
+TIMELINE_LENGTH = 500
+
+timeline_entry = TimelineEntry.__table__
+COLUMNS = ["user_id", "outfit_id", "author_id", "created_at"]
+
+
+def fan_out_outfit(outfit: Outfit) -> None:
+    followers = select(
+        Follow.follower_id,
+        literal(outfit.id, UUIDKey),
+        literal(outfit.user_id, UUIDKey),
+        literal(outfit.created_at),
+    ).where(Follow.followee_id == outfit.user_id, Follow.status == "Accepted")
+
+    db.session.execute(timeline_entry.insert().from_select(COLUMNS, followers))
+
+
+def remove_outfit_from_timelines(outfit_id: str) -> None:
+    db.session.execute(
+        timeline_entry.delete().where(timeline_entry.c.outfit_id == outfit_id)
+    )
+
+
+def backfill_timeline(user_id: str, author_id: str) -> None:
+    remove_author_from_timeline(user_id, author_id)
+
+    recent_outfits = (
+        select(
+            literal(user_id, UUIDKey),
+            Outfit.id,
+            Outfit.user_id,
+            Outfit.created_at,
+        )
+        .where(Outfit.user_id == author_id, Outfit.created_at.isnot(None))
+        .order_by(Outfit.created_at.desc())
+        .limit(TIMELINE_LENGTH)
+    )
+
+    db.session.execute(timeline_entry.insert().from_select(COLUMNS, recent_outfits))
+    trim_timeline(user_id)
+
+
+def remove_author_from_timeline(user_id: str, author_id: str) -> None:
+    db.session.execute(
+        timeline_entry.delete().where(
+            timeline_entry.c.user_id == user_id,
+            timeline_entry.c.author_id == author_id,
+        )
+    )
+
+
+def trim_timeline(user_id: str) -> int:
+    cutoff = (
+        db.session.query(TimelineEntry.created_at)
+        .filter(TimelineEntry.user_id == user_id)
+        .order_by(TimelineEntry.created_at.desc())
+        .offset(TIMELINE_LENGTH - 1)
+        .limit(1)
+        .scalar()
+    )
+
+    if cutoff is None:
+        return 0
+
+    return db.session.execute(
+        timeline_entry.delete().where(
+            timeline_entry.c.user_id == user_id,
+            timeline_entry.c.created_at < cutoff,
+        )
+    ).rowcount
+
+
+def trim_timelines() -> int:
+    overflowing = (
+        db.session.query(TimelineEntry.user_id)
+        .group_by(TimelineEntry.user_id)
+        .having(func.count() > TIMELINE_LENGTH)
+    )
+
+    trimmed = sum(trim_timeline(user_id) for (user_id,) in overflowing.all())
+    db.session.commit()
+
+    return trimmed
+
+
+def rebuild_timelines() -> int:
+    db.session.execute(timeline_entry.delete())
+
+    follows = db.session.query(Follow.follower_id, Follow.followee_id).filter_by(
+        status="Accepted"
+    )
+    for follower_id, followee_id in follows.all():
+        backfill_timeline(follower_id, followee_id)
+
+    db.session.commit()
+
+    return trim_timelines()
+
+
+def timeline_query(user_id: str):
+    return TimelineEntry.query.filter(TimelineEntry.user_id == user_id)
+
+
+def hydrate_timeline(entries: list) -> list:
+    outfit_ids = [entry.outfit_id for entry in entries]
+
+    if not outfit_ids:
+        return []
+
+    outfits = {
+        outfit.id: outfit
+        for outfit in Outfit.query.filter(Outfit.id.in_(outfit_ids)).all()
+    }
+
+    return [outfits[outfit_id] for outfit_id in outfit_ids if outfit_id in outfits]
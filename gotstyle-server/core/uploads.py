@@ -0,0 +1,108 @@
+from flask import request
+from typing import BinaryIO, Iterator
+from werkzeug.sansio.multipart import (
+    NEED_DATA,
+    Data,
+    Epilogue,
+    Field,
+    File,
+    MultipartDecoder,
+)
+from core.s3 import CHUNK_SIZE, get_image_format
+import io
+import shutil
+import tempfile
+
+# Uploads smaller than this stay in memory, larger ones spill to a temp file.
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+class _ChunkReader(io.RawIOBase):
+    def __init__(self, chunks: Iterator[bytes]):
+        self.chunks = chunks
+        self.rest = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self.rest:
+            self.rest = next(self.chunks, b"")
+
+            if not self.rest:
+                return 0
+
+        size = min(len(buffer), len(self.rest))
+        buffer[:size] = self.rest[:size]
+        self.rest = self.rest[size:]
+
+        return size
+
+
+def _multipart_file(stream: BinaryIO, boundary: bytes, field: str) -> Iterator:
+    """Yield the contents of the ``field`` file part of a multipart body as
+    they are read from ``stream``. Other parts are skipped, not buffered."""
+    decoder = MultipartDecoder(boundary)
+    part = None
+
+    while True:
+        event = decoder.next_event()
+
+        if event is NEED_DATA:
+            decoder.receive_data(stream.read(CHUNK_SIZE) or None)
+        elif isinstance(event, (Field, File)):
+            part = event
+        elif isinstance(event, Data):
+            if isinstance(part, File) and part.name == field:
+                yield event.data
+
+                if not event.more_data:
+                    return
+        elif isinstance(event, Epilogue):
+            return
+
+
+def open_upload(field: str = "image") -> tuple[bytes, BinaryIO]:
+    """Return the first chunk of the uploaded image and the rest of the stream.
+
+    Accepts either a multipart form with the image in ``field`` or the raw
+    image bytes as the request body. A multipart body is parsed as it is
+    read rather than through request.files, so in both cases only the first
+    chunk of the image has been read when anything that is not a supported
+    image is rejected.
+    """
+    if request.mimetype == "multipart/form-data":
+        boundary = request.mimetype_params.get("boundary")
+
+        if not boundary:
+            raise ValueError("Invalid multipart body")
+
+        stream = io.BufferedReader(
+            _ChunkReader(_multipart_file(request.stream, boundary.encode(), field)),
+            CHUNK_SIZE,
+        )
+    else:
+        stream = request.stream
+
+    first_chunk = stream.read(CHUNK_SIZE)
+
+    if not first_chunk:
+        raise ValueError(f"{field} is required")
+
+    if get_image_format(first_chunk[:8]) == "UNKNOWN":
+        raise ValueError("Unknown image format")
+
+    return first_chunk, stream
+
+
+def write_upload(first_chunk: bytes, stream: BinaryIO, dest: BinaryIO) -> None:
+    dest.write(first_chunk)
+    shutil.copyfileobj(stream, dest, CHUNK_SIZE)
+
+
+def spool_upload(first_chunk: bytes, stream: BinaryIO) -> BinaryIO:
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    write_upload(first_chunk, stream, spool)
+    spool.seek(0)
+
+    return spool
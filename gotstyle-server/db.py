@@ -1,3 +1,170 @@
+from collections import defaultdict
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.types import BINARY, LargeBinary, TypeDecorator, UserDefinedType
+import functools
+import uuid
 
 db = SQLAlchemy()
+
+# Binds for strings that are not UUIDs, e.g. a mistyped id in a URL. No key
+# is ever the nil UUID, so such lookups find nothing instead of failing.
+NIL_UUID = uuid.UUID(int=0)
+
+# pg_type oid of uuid.
+POSTGRES_UUID_OID = 2950
+
+
+def _read_uuids_as_strings(dbapi_connection, connection_record):
+    # SQLAlchemy has psycopg2 parse every uuid it reads into a uuid.UUID, only
+    # for UUIDKey to format it back into a string. Keep the text it received.
+    if type(dbapi_connection).__module__.startswith("psycopg2"):
+        from psycopg2.extensions import UNICODE, new_type, register_type
+
+        register_type(
+            new_type((POSTGRES_UUID_OID,), "UUIDKEY", UNICODE), dbapi_connection
+        )
+
+
+def init_engine(app) -> None:
+    """Connection setup for the engine of ``app``, after db.init_app."""
+    with app.app_context():
+        # On the engine itself: a listener on the Engine class would run
+        # before SQLAlchemy's own connect hook, which would undo it.
+        event.listen(db.engine, "connect", _read_uuids_as_strings)
+
+
+# The same keys (authors, followers...) are read over and over, a hit costs a
+# fraction of formatting one.
+@functools.lru_cache(maxsize=16384)
+def _key_string(value: bytes) -> str:
+    h = value.hex()
+
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+class _PostgresUUID(UserDefinedType):
+    # Not postgresql.UUID, which casts every bind to uuid. Plain string binds
+    # compare against uuid and varchar columns alike, so the app keeps working
+    # while the key columns are being converted.
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return "UUID"
+
+
+class UUIDKey(TypeDecorator):
+    """A UUID key, stored as a native uuid on PostgreSQL and as 16 raw bytes
+    elsewhere. The app reads and writes it as the canonical string."""
+
+    impl = LargeBinary(16)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return _PostgresUUID()
+
+        if dialect.name in ("mysql", "mariadb"):
+            return dialect.type_descriptor(BINARY(16))
+
+        return dialect.type_descriptor(LargeBinary(16))
+
+    def _uuid(self, value) -> uuid.UUID:
+        if isinstance(value, uuid.UUID):
+            return value
+
+        try:
+            return uuid.UUID(value)
+        except (TypeError, ValueError):
+            return NIL_UUID
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+
+        if dialect.name == "postgresql":
+            return str(self._uuid(value))
+
+        return self._uuid(value).bytes
+
+    def literal_processor(self, dialect):
+        def process(value):
+            if dialect.name == "postgresql":
+                return f"'{self._uuid(value)}'"
+
+            return f"X'{self._uuid(value).hex}'"
+
+        return process
+
+    def result_processor(self, dialect, coltype):
+        # The driver already hands out the string, see _read_uuids_as_strings.
+        if dialect.driver == "psycopg2":
+            return None
+
+        if dialect.name == "postgresql":
+            return super().result_processor(dialect, coltype)
+
+        # Runs for every key read, skips the TypeDecorator plumbing.
+        def process(value):
+            return None if value is None else _key_string(value)
+
+        return process
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, str):
+            return value
+
+        if isinstance(value, uuid.UUID):
+            return str(value)
+
+        return _key_string(bytes(value))
+
+
+def insert_all(objects: list) -> None:
+    """Insert new model instances with one multi-row INSERT per table instead
+    of flushing them one by one. The instances are not added to the session.
+    Unset columns get their Python-side default, or NULL."""
+    rows = defaultdict(list)
+
+    for obj in objects:
+        table = obj.__table__
+        row = {}
+
+        for column in table.columns:
+            value = getattr(obj, column.key)
+
+            default = column.default
+            if value is None and default is not None:
+                if default.is_scalar:
+                    value = default.arg
+                elif default.is_callable:
+                    value = default.arg(None)
+
+            row[column.key] = value
+
+        rows[table].append(row)
+
+    for table, table_rows in rows.items():
+        db.session.execute(table.insert(), table_rows)
+
+
+def upsert(table, rows: list, keys: list, update) -> None:
+    """Insert ``rows`` into ``table`` in one statement, a row that conflicts
+    with an existing one on the ``keys`` columns updates it instead.
+    ``update(proposed)`` returns the SET clause, ``proposed`` being the
+    columns of the row that was about to be inserted. Rows that share keys
+    are locked in the order of ``rows``, sort them to avoid deadlocks."""
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ("mysql", "mariadb"):
+        statement = mysql.insert(table).values(rows)
+        statement = statement.on_duplicate_key_update(update(statement.inserted))
+    else:
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        statement = insert(table).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=keys, set_=update(statement.excluded)
+        )
+
+    db.session.execute(statement)
@@ -10,3 +10,14 @@ if os.environ.get("FLASK_ENV") == "production":
 else:
     DATABASE_URI = os.environ.get("DATABASE_URL_DEV")
     debug = True
+
+# Connection pool of each process. A pooled connection per concurrent request
+# (see gunicorn_config.py), plus some overflow for bursts, and
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) must stay below the server's
+# max_connections. Connections are checked before use and replaced every
+# DB_POOL_RECYCLE seconds so ones dropped by the server or a proxy are not
+# handed out.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
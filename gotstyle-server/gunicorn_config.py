@@ -1,2 +1,47 @@
-bind = "0.0.0.0:8000"
-workers = 4
+import os
+
+# Handlers mostly wait on the database, S3 and Expo, so each worker process
+# serves several requests at once:
+#   gthread (default)  a thread per in-flight request, GUNICORN_THREADS per
+#                      worker. Works with every driver as is.
+#   gevent             a greenlet per in-flight request, up to
+#                      GUNICORN_WORKER_CONNECTIONS per worker. Needs
+#                      `pip install gevent psycogreen` (psycopg2 only yields
+#                      to other greenlets once psycogreen is installed).
+#   sync               one request per worker, the previous behaviour.
+# See "Deployment" in the README for sizing.
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "100"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+keepalive = 5
+
+# The in-memory cache lives in one process, so the other workers would keep
+# serving what it has already invalidated.
+if os.getenv("CACHE_BACKEND") == "memory" and workers > 1:
+    raise RuntimeError(
+        "CACHE_BACKEND=memory needs GUNICORN_WORKERS=1, use redis or none instead"
+    )
+
+# Size each worker's connection pool to its concurrency unless it is set
+# explicitly: a thread never waits for a connection, and greenlets share a
+# bounded pool instead of opening one connection each.
+if worker_class == "gthread":
+    os.environ.setdefault("DB_POOL_SIZE", str(threads))
+elif worker_class == "gevent":
+    os.environ.setdefault("DB_POOL_SIZE", "20")
+
+
+def post_fork(server, worker):
+    if worker_class != "gevent":
+        return
+
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning("psycogreen is not installed, queries block the worker")
+        return
+
+    patch_psycopg()
@@ -0,0 +1,462 @@
+"""store uuid keys as native uuid or 16 byte binary
+
+Revision ID: 0df714029259
+Revises: f4d9c4d1fc61
+Create Date: 2026-10-18 15:02:41.518204
+
+On PostgreSQL the key columns are converted online: shadow uuid columns are
+added and kept in sync by triggers, backfilled in small batches and indexed
+concurrently, then swapped in with one short transaction that only touches
+the catalog. The app keeps serving throughout, db.UUIDKey binds plain strings
+that compare against varchar and uuid columns alike.
+
+SQLite and MySQL rewrite the tables in place, run those offline.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import time
+import uuid
+
+import db
+
+
+# revision identifiers, used by Alembic.
+revision = '0df714029259'
+down_revision = 'f4d9c4d1fc61'
+branch_labels = None
+depends_on = None
+
+
+KEY_COLUMNS = {
+    "user": ["id"],
+    "push_message": ["id"],
+    "token_block_list": ["id"],
+    "follow": ["id", "follower_id", "followee_id"],
+    "notification": ["id", "user_id", "sender_id", "entity_id"],
+    "notification_event": ["id", "user_id", "sender_id", "entity_id"],
+    "notification_actor": ["notification_id", "user_id"],
+    "outfit": ["id", "user_id"],
+    "outfit_hashtag": ["id", "outfit_id"],
+    "outfit_image": ["id", "outfit_id"],
+    "outfit_link": ["id", "outfit_id"],
+    "outfit_poll": ["id", "outfit_id"],
+    "poll_option": ["id", "poll_id"],
+    "outfit_like": ["outfit_id", "user_id"],
+    "outfit_save": ["outfit_id", "user_id"],
+    "outfit_search_token": ["outfit_id"],
+    "timeline_entry": ["user_id", "outfit_id", "author_id"],
+    "comment": ["id", "user_id", "outfit_id"],
+    "comment_answer": ["id", "user_id", "comment_id", "commenter_id"],
+    "comment_like": ["comment_id", "user_id"],
+    "comment_reply_like": ["comment_answer_id", "user_id"],
+}
+
+# Heap pages per backfill statement, each one commits on its own so no lock
+# or row version is held for long.
+BACKFILL_PAGES = 1000
+# Schema changes lock their tables up front and give up quickly when a query
+# holds them: below deadlock_timeout (1s by default), so when the migration
+# and a request deadlock, the migration is the one that backs off. The app's
+# queries queue behind a lock attempt for at most this long.
+LOCK_TIMEOUT = "500ms"
+LOCK_ATTEMPTS = 20
+LOCK_RETRY_SECONDS = 1
+
+UUID_PATTERN = "^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$"
+
+
+def _q(name):
+    return op.get_bind().dialect.identifier_preparer.quote(name)
+
+
+def _shadow(column):
+    return f"{column}__uuid"
+
+
+def _not_null_check(table, column):
+    return f"{table}_{_shadow(column)}_not_null"
+
+
+def _key_foreign_keys(inspector):
+    """(table, foreign key) for every foreign key over converted columns."""
+    return [
+        (table, fk)
+        for table in KEY_COLUMNS
+        for fk in inspector.get_foreign_keys(table)
+        if set(fk["constrained_columns"]) <= set(KEY_COLUMNS[table])
+    ]
+
+
+def _drop_foreign_keys(foreign_keys):
+    return [
+        f"ALTER TABLE {_q(table)} DROP CONSTRAINT {_q(fk['name'])}"
+        for table, fk in foreign_keys
+    ]
+
+
+def _create_foreign_keys(foreign_keys, not_valid=False):
+    statements = []
+
+    for table, fk in foreign_keys:
+        ondelete = fk.get("options", {}).get("ondelete")
+        statements.append(
+            f"ALTER TABLE {_q(table)} ADD CONSTRAINT {_q(fk['name'])} "
+            f"FOREIGN KEY ({', '.join(map(_q, fk['constrained_columns']))}) "
+            f"REFERENCES {_q(fk['referred_table'])} "
+            f"({', '.join(map(_q, fk['referred_columns']))})"
+            + (f" ON DELETE {ondelete}" if ondelete else "")
+            + (" NOT VALID" if not_valid else "")
+        )
+
+    return statements
+
+
+def _check_values(bind):
+    for table, columns in KEY_COLUMNS.items():
+        for column in columns:
+            invalid = bind.execute(
+                sa.text(
+                    f"SELECT count(*) FROM {_q(table)} "
+                    f"WHERE {_q(column)} IS NOT NULL "
+                    f"AND lower({_q(column)}::text) !~ :pattern"
+                ),
+                {"pattern": UUID_PATTERN},
+            ).scalar()
+
+            if invalid:
+                raise RuntimeError(
+                    f"{table}.{column} has {invalid} values that are not UUIDs"
+                )
+
+
+def _key_indexes(inspector, table):
+    """(name, columns, unique) of the primary key, unique constraints and
+    indexes of ``table`` that cover a converted column."""
+    columns = set(KEY_COLUMNS[table])
+    pk = inspector.get_pk_constraint(table)
+    indexes = []
+
+    if set(pk["constrained_columns"]) & columns:
+        indexes.append((pk["name"], pk["constrained_columns"], True))
+
+    for index in inspector.get_indexes(table):
+        if set(index["column_names"]) & columns:
+            indexes.append((index["name"], index["column_names"], index["unique"]))
+
+    # Unique constraints also show up as indexes on PostgreSQL.
+    names = {name for name, _, _ in indexes}
+    for unique in inspector.get_unique_constraints(table):
+        if set(unique["column_names"]) & columns and unique["name"] not in names:
+            indexes.append((unique["name"], unique["column_names"], True))
+
+    return indexes
+
+
+def _locked_transaction(tables, statements):
+    """Run ``statements`` in one transaction that first takes an exclusive
+    lock on ``tables``, retrying while requests hold them."""
+    bind = op.get_bind()
+
+    for _ in range(LOCK_ATTEMPTS):
+        bind.exec_driver_sql("BEGIN")
+
+        try:
+            bind.exec_driver_sql(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+            bind.exec_driver_sql(
+                f"LOCK TABLE {', '.join(map(_q, tables))} IN ACCESS EXCLUSIVE MODE"
+            )
+
+            for statement in statements:
+                bind.exec_driver_sql(statement)
+
+            bind.exec_driver_sql("COMMIT")
+            return
+        except sa.exc.OperationalError as e:
+            bind.exec_driver_sql("ROLLBACK")
+
+            # lock_not_available, deadlock_detected
+            if getattr(e.orig, "pgcode", None) not in ("55P03", "40P01"):
+                raise
+
+        time.sleep(LOCK_RETRY_SECONDS)
+
+    raise RuntimeError(f"Could not lock {', '.join(tables)}, run the migration again")
+
+
+def _expand(inspector, table, columns):
+    """Shadow uuid columns that every write to ``table`` fills from now on."""
+    nullable = {c["name"]: c["nullable"] for c in inspector.get_columns(table)}
+    function = f"{table}__uuid_sync"
+    statements = []
+    assignments = []
+
+    for column in columns:
+        shadow = _shadow(column)
+        statements.append(
+            f"ALTER TABLE {_q(table)} ADD COLUMN IF NOT EXISTS {_q(shadow)} uuid"
+        )
+        assignments.append(f"NEW.{_q(shadow)} := NEW.{_q(column)}::uuid;")
+
+        if not nullable[column]:
+            check = _not_null_check(table, column)
+            statements += [
+                f"ALTER TABLE {_q(table)} DROP CONSTRAINT IF EXISTS {_q(check)}",
+                f"ALTER TABLE {_q(table)} ADD CONSTRAINT {_q(check)} "
+                f"CHECK ({_q(shadow)} IS NOT NULL) NOT VALID",
+            ]
+
+    return statements + [
+        f"CREATE OR REPLACE FUNCTION {_q(function)}() RETURNS trigger "
+        f"LANGUAGE plpgsql AS $$ BEGIN {' '.join(assignments)} RETURN NEW; END $$",
+        f"DROP TRIGGER IF EXISTS {_q(function)} ON {_q(table)}",
+        f"CREATE TRIGGER {_q(function)} BEFORE INSERT OR UPDATE ON {_q(table)} "
+        f"FOR EACH ROW EXECUTE PROCEDURE {_q(function)}()",
+    ]
+
+
+def _backfill(bind, table, columns):
+    """Fill the shadow columns of the rows written before the trigger, a
+    range of heap pages at a time."""
+    pages = bind.execute(
+        sa.text(
+            "SELECT pg_relation_size(CAST(:table AS regclass)) "
+            "/ current_setting('block_size')::int"
+        ),
+        {"table": _q(table)},
+    ).scalar()
+    assignments = ", ".join(
+        f"{_q(_shadow(column))} = {_q(column)}::uuid" for column in columns
+    )
+
+    for start in range(0, pages + 1, BACKFILL_PAGES):
+        bind.exec_driver_sql(
+            f"UPDATE {_q(table)} SET {assignments} "
+            f"WHERE ctid >= '({start},0)'::tid "
+            f"AND ctid < '({start + BACKFILL_PAGES},0)'::tid"
+        )
+
+    # Only blocks other schema changes, reads and writes go through.
+    for column in columns:
+        check = _not_null_check(table, column)
+        bind.exec_driver_sql(
+            f"DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_constraint "
+            f"WHERE conname = '{check}') THEN "
+            f"ALTER TABLE {_q(table)} VALIDATE CONSTRAINT {_q(check)}; "
+            f"END IF; END $$"
+        )
+
+
+def _build_indexes(bind, inspector, table, columns):
+    """Build the shadow columns' copies of the key indexes without blocking
+    writes."""
+    for name, index_columns, unique in _key_indexes(inspector, table):
+        shadow_columns = [_shadow(c) if c in columns else c for c in index_columns]
+        bind.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {_q(_shadow(name))}")
+        bind.exec_driver_sql(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY "
+            f"{_q(_shadow(name))} ON {_q(table)} "
+            f"({', '.join(map(_q, shadow_columns))})"
+        )
+
+
+def _swap(inspector, table, columns):
+    """Replace the key columns of ``table`` by their shadows. Catalog
+    changes only, the validated checks let SET NOT NULL skip its scan."""
+    function = f"{table}__uuid_sync"
+    indexes = _key_indexes(inspector, table)
+    pk = inspector.get_pk_constraint(table)
+    uniques = {u["name"] for u in inspector.get_unique_constraints(table)}
+    nullable = {c["name"]: c["nullable"] for c in inspector.get_columns(table)}
+    statements = [
+        f"DROP TRIGGER {_q(function)} ON {_q(table)}",
+        f"DROP FUNCTION {_q(function)}()",
+    ]
+
+    if set(pk["constrained_columns"]) & set(columns):
+        statements.append(f"ALTER TABLE {_q(table)} DROP CONSTRAINT {_q(pk['name'])}")
+
+    for name, index_columns, unique in indexes:
+        if name in uniques:
+            statements.append(f"ALTER TABLE {_q(table)} DROP CONSTRAINT {_q(name)}")
+
+    for column in columns:
+        statements += [
+            f"ALTER TABLE {_q(table)} DROP COLUMN {_q(column)}",
+            f"ALTER TABLE {_q(table)} RENAME COLUMN {_q(_shadow(column))} "
+            f"TO {_q(column)}",
+        ]
+
+        if not nullable[column]:
+            statements += [
+                f"ALTER TABLE {_q(table)} ALTER COLUMN {_q(column)} SET NOT NULL",
+                f"ALTER TABLE {_q(table)} DROP CONSTRAINT "
+                f"{_q(_not_null_check(table, column))}",
+            ]
+
+    for name, index_columns, unique in indexes:
+        if name == pk["name"]:
+            statements.append(
+                f"ALTER TABLE {_q(table)} ADD CONSTRAINT {_q(name)} "
+                f"PRIMARY KEY USING INDEX {_q(_shadow(name))}"
+            )
+        elif name in uniques:
+            statements.append(
+                f"ALTER TABLE {_q(table)} ADD CONSTRAINT {_q(name)} "
+                f"UNIQUE USING INDEX {_q(_shadow(name))}"
+            )
+        else:
+            statements.append(f"ALTER INDEX {_q(_shadow(name))} RENAME TO {_q(name)}")
+
+    return statements
+
+
+def _upgrade_postgresql():
+    bind = op.get_bind()
+    # Reflected once, before any change, and reused by every step.
+    inspector = sa.inspect(bind)
+    _check_values(bind)
+    foreign_keys = _key_foreign_keys(inspector)
+
+    with op.get_context().autocommit_block():
+        for table, columns in KEY_COLUMNS.items():
+            _locked_transaction([table], _expand(inspector, table, columns))
+
+        for table, columns in KEY_COLUMNS.items():
+            _backfill(bind, table, columns)
+            _build_indexes(bind, inspector, table, columns)
+
+        # Every table at once, a request never sees old and new key types
+        # side by side.
+        _locked_transaction(
+            list(KEY_COLUMNS),
+            _drop_foreign_keys(foreign_keys)
+            + [
+                statement
+                for table, columns in KEY_COLUMNS.items()
+                for statement in _swap(inspector, table, columns)
+            ]
+            + _create_foreign_keys(foreign_keys, not_valid=True),
+        )
+
+        # Validating only takes a lock that lets reads and writes through.
+        for table, fk in foreign_keys:
+            bind.exec_driver_sql(
+                f"ALTER TABLE {_q(table)} VALIDATE CONSTRAINT {_q(fk['name'])}"
+            )
+
+
+def _downgrade_postgresql():
+    inspector = sa.inspect(op.get_bind())
+    foreign_keys = _key_foreign_keys(inspector)
+
+    for statement in _drop_foreign_keys(foreign_keys):
+        op.execute(statement)
+
+    for table, columns in KEY_COLUMNS.items():
+        op.execute(
+            f"ALTER TABLE {_q(table)} "
+            + ", ".join(
+                f"ALTER COLUMN {_q(column)} TYPE varchar(36) USING {_q(column)}::text"
+                for column in columns
+            )
+        )
+
+    for statement in _create_foreign_keys(foreign_keys):
+        op.execute(statement)
+
+
+def _sqlite_functions():
+    connection = op.get_bind().connection.driver_connection
+
+    def to_key(value):
+        if value is None or isinstance(value, bytes) and len(value) == 16:
+            return value
+
+        if isinstance(value, bytes):
+            value = value.decode()
+
+        return uuid.UUID(value).bytes
+
+    def to_string(value):
+        if value is None or isinstance(value, str):
+            return value
+
+        return str(uuid.UUID(bytes=value))
+
+    connection.create_function("uuid_to_key", 1, to_key, deterministic=True)
+    connection.create_function("uuid_to_string", 1, to_string, deterministic=True)
+
+
+def _rewrite_sqlite(function, type_, existing_type):
+    _sqlite_functions()
+
+    # SQLite stores any value in any column, converting first means the
+    # table copy below never has to cast a key.
+    for table, columns in KEY_COLUMNS.items():
+        op.execute(
+            f"UPDATE {_q(table)} SET "
+            + ", ".join(f"{_q(c)} = {function}({_q(c)})" for c in columns)
+        )
+
+        with op.batch_alter_table(table, recreate="always") as batch_op:
+            for column in columns:
+                batch_op.alter_column(column, type_=type_, existing_type=existing_type)
+
+
+def _rewrite_mysql(temporary_type, expression, type_):
+    inspector = sa.inspect(op.get_bind())
+    foreign_keys = _key_foreign_keys(inspector)
+
+    for table, fk in foreign_keys:
+        op.drop_constraint(fk["name"], table, type_="foreignkey")
+
+    for table, columns in KEY_COLUMNS.items():
+        nullable = {c["name"]: c["nullable"] for c in inspector.get_columns(table)}
+
+        for column in columns:
+            op.alter_column(
+                table, column, type_=temporary_type, existing_nullable=nullable[column]
+            )
+
+        op.execute(
+            f"UPDATE {_q(table)} SET "
+            + ", ".join(f"{_q(c)} = {expression.format(_q(c))}" for c in columns)
+        )
+
+        for column in columns:
+            op.alter_column(
+                table, column, type_=type_, existing_nullable=nullable[column]
+            )
+
+    for statement in _create_foreign_keys(foreign_keys):
+        op.execute(statement)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        _upgrade_postgresql()
+    elif dialect == "sqlite":
+        _rewrite_sqlite("uuid_to_key", db.UUIDKey(), sa.String(length=36))
+    else:
+        _rewrite_mysql(
+            sa.VARBINARY(36), "UNHEX(REPLACE({}, '-', ''))", sa.BINARY(16)
+        )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        _downgrade_postgresql()
+    elif dialect == "sqlite":
+        _rewrite_sqlite("uuid_to_string", sa.String(length=36), db.UUIDKey())
+    else:
+        _rewrite_mysql(
+            sa.VARBINARY(36),
+            "LOWER(INSERT(INSERT(INSERT(INSERT(HEX({0}), 21, 0, '-'), 17, 0, '-'), "
+            "13, 0, '-'), 9, 0, '-'))",
+            sa.String(length=36),
+        )
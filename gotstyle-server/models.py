@@ -1,35 +1,50 @@
 from datetime import datetime
-from db import db
+from db import UUIDKey, db
+
+
+def image_variants(variants, image_url):
+    if variants:
+        return variants
+
+    return {"full": image_url} if image_url else {}
+
 
 outfit_like = db.Table(
     "outfit_like",
-    db.Column("outfit_id", db.String(36), db.ForeignKey("outfit.id"), primary_key=True),
-    db.Column("user_id", db.String(36), db.ForeignKey("user.id"), primary_key=True),
+    db.Column("outfit_id", UUIDKey, db.ForeignKey("outfit.id"), primary_key=True),
+    db.Column("user_id", UUIDKey, db.ForeignKey("user.id"), primary_key=True),
+    db.Index("ix_outfit_like_user_id", "user_id"),
 )
 
 outfit_save = db.Table(
     "outfit_save",
-    db.Column("outfit_id", db.String(36), db.ForeignKey("outfit.id"), primary_key=True),
-    db.Column("user_id", db.String(36), db.ForeignKey("user.id"), primary_key=True),
+    db.Column("outfit_id", UUIDKey, db.ForeignKey("outfit.id"), primary_key=True),
+    db.Column("user_id", UUIDKey, db.ForeignKey("user.id"), primary_key=True),
+    db.Index("ix_outfit_save_user_id", "user_id"),
 )
 
 comment_likes = db.Table(
     "comment_like",
-    db.Column("comment_id", db.String(36), db.ForeignKey("comment.id")),
-    db.Column("user_id", db.String(36), db.ForeignKey("user.id")),
+    db.Column("comment_id", UUIDKey, db.ForeignKey("comment.id"), primary_key=True),
+    db.Column("user_id", UUIDKey, db.ForeignKey("user.id"), primary_key=True),
 )
 
 comment_reply_likes = db.Table(
     "comment_reply_like",
-    db.Column("comment_answer_id", db.String(36), db.ForeignKey("comment_answer.id")),
-    db.Column("user_id", db.String(36), db.ForeignKey("user.id")),
+    db.Column(
+        "comment_answer_id",
+        UUIDKey,
+        db.ForeignKey("comment_answer.id"),
+        primary_key=True,
+    ),
+    db.Column("user_id", UUIDKey, db.ForeignKey("user.id"), primary_key=True),
 )
 
 
 # User model
 class User(db.Model):
     __tablename__ = "user"
-    id = db.Column(db.String(36), primary_key=True)
+    id = db.Column(UUIDKey, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(120), nullable=False)
@@ -54,6 +69,13 @@ class User(db.Model):
     expo_push_token = db.Column(db.String(200), nullable=True)
     notifications = db.relationship("Notification", backref="user", lazy=True)
     verified = db.Column(db.Boolean, default=False)
+    image_variants = db.Column(db.JSON, nullable=True)
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    save_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    unread_notification_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
 
     def to_dict(self):
         followers = (
@@ -76,6 +98,7 @@ class User(db.Model):
             "email": self.email,
             "created_at": self.created_at,
             "image_url": self.image_url,
+            "image_variants": image_variants(self.image_variants, self.image_url),
             "bio": self.bio,
             "updated_at": self.updated_at,
             "outfits": [outfit.to_dict() for outfit in self.outfits],
@@ -173,11 +196,11 @@ class User(db.Model):
 # Outfit model
 class Outfit(db.Model):
     __tablename__ = "outfit"
-    id = db.Column(db.String(36), primary_key=True)
+    id = db.Column(UUIDKey, primary_key=True)
     photo_url = db.Column(db.String(200), nullable=True)
     shoes_url = db.Column(db.String(200), nullable=True)
     video_url = db.Column(db.String(200), nullable=True)
-    user_id = db.Column(db.String(36), db.ForeignKey("user.id"), nullable=False)
+    user_id = db.Column(UUIDKey, db.ForeignKey("user.id"), nullable=False)
     description = db.Column(db.String(200), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     likes = db.relationship(
@@ -192,6 +215,14 @@ class Outfit(db.Model):
     style = db.Column(db.String(50), nullable=True)
     outfit_images = db.relationship("OutfitImage", backref="outfit", lazy=True)
     links = db.relationship("OutfitLink", backref="outfit", lazy=True)
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    save_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        db.Index("ix_outfit_user_created", "user_id", "created_at"),
+        db.Index("ix_outfit_created", "created_at", "id"),
+    )
 
     def to_dict(self):
         followers = (
@@ -263,29 +294,43 @@ class Outfit(db.Model):
 # Outfit Image model
 class OutfitImage(db.Model):
     __tablename__ = "outfit_image"
-    id = db.Column(db.String(36), primary_key=True)
+    id = db.Column(UUIDKey, primary_key=True)
     outfit_id = db.Column(
-        db.String(36),
+        UUIDKey,
         db.ForeignKey("outfit.id"),
         nullable=False,
+        index=True,
     )
     image_url = db.Column(db.String(200), nullable=True)
+    status = db.Column(
+        db.String(20), nullable=False, default="Ready", server_default="Ready"
+    )
+    variants = db.Column(db.JSON, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_outfit_image_status_next_attempt", "status", "next_attempt_at"),
+    )
 
     def to_dict(self):
         return {
             "id": self.id,
             "outfit_id": self.outfit_id,
             "image_url": self.image_url,
+            "status": self.status,
+            "variants": image_variants(self.variants, self.image_url),
         }
 
 
 class OutfitLink(db.Model):
     __tablename__ = "outfit_link"
-    id = db.Column(db.String(36), primary_key=True)
+    id = db.Column(UUIDKey, primary_key=True)
     outfit_id = db.Column(
-        db.String(36),
+        UUIDKey,
         db.ForeignKey("outfit.id"),
         nullable=False,
+        index=True,
     )
     link = db.Column(db.String(200), nullable=False)
     description = db.Column(db.String(200), nullable=True)
@@ -301,9 +346,9 @@ class OutfitLink(db.Model):
 
 # Outfit Poll model
 class OutfitPoll(db.Model):
-    id = db.Column(db.String(36), primary_key=True)
+    id = db.Column(UUIDKey, primary_key=True)
     outfit_id = db.Column(
-        db.String(36),
+        UUIDKey,
         db.ForeignKey("outfit.id"),
         nullable=False,
     )
@@ -322,9 +367,9 @@ class OutfitPoll(db.Model):
 
 
 class PollOption(db.Model):
-    id = db.Column(db.String(36), primary_key=True)
+    id = db.Column(UUIDKey, primary_key=True)
     poll_id = db.Column(
-        db.String(36),
+        UUIDKey,
         db.ForeignKey("outfit_poll.id"),
         nullable=False,
     )
@@ -342,25 +387,35 @@ class PollOption(db.Model):
 
 class OutfitHashtag(db.Model):
     __tablename__ = "outfit_hashtag"
-    id = db.Column(db.String(36), primary_key=True)
+    id = db.Column(UUIDKey, primary_key=True)
     outfit_id = db.Column(
-        db.String(36),
+        UUIDKey,
         db.ForeignKey("outfit.id"),
         nullable=False,
+        index=True,
     )
-    hashtag = db.Column(db.String(100), nullable=False)
+    hashtag = db.Column(db.String(100), nullable=False, index=True)
+    normalized = db.Column(db.String(100), nullable=True, index=True)
 
     def to_dict(self):
         return {"id": self.id, "outfit_id": self.outfit_id, "hashtag": self.hashtag}
 
 
+# Hashtag daily count model
+class HashtagDailyCount(db.Model):
+    __tablename__ = "hashtag_daily_count"
+    day = db.Column(db.Date, primary_key=True)
+    hashtag = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
 # Comment model
 class Comment(db.Model):
     __tablename__ = "comment"
-    id = db.Column(db.String(36), primary_key=True)
+    id = db.Column(UUIDKey, primary_key=True)
     text = db.Column(db.Text, nullable=False)
-    user_id = db.Column(db.String(36), db.ForeignKey("user.id"), nullable=False)
-    outfit_id = db.Column(db.String(36), db.ForeignKey("outfit.id"), nullable=False)
+    user_id = db.Column(UUIDKey, db.ForeignKey("user.id"), nullable=False)
+    outfit_id = db.Column(UUIDKey, db.ForeignKey("outfit.id"), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow)
     likes = db.relationship(
@@ -370,6 +425,8 @@ class Comment(db.Model):
     )
     answers = db.relationship("CommentAnswer", backref="comment", lazy=True)
 
+    __table_args__ = (db.Index("ix_comment_outfit_created", "outfit_id", "created_at"),)
+
     def to_dict(self):
         replies = CommentAnswer.query.filter_by(comment_id=self.id).all()
 
@@ -400,11 +457,11 @@ class Comment(db.Model):
 # Comment Answer model
 class CommentAnswer(db.Model):
     __tablename__ = "comment_answer"
-    id = db.Column(db.String(36), primary_key=True)
+    id = db.Column(UUIDKey, primary_key=True)
     text = db.Column(db.Text, nullable=False)
-    user_id = db.Column(db.String(36), db.ForeignKey("user.id"), nullable=False)
-    comment_id = db.Column(db.String(36), db.ForeignKey("comment.id"), nullable=False)
-    commenter_id = db.Column(db.String(36), nullable=False)
+    user_id = db.Column(UUIDKey, db.ForeignKey("user.id"), nullable=False)
+    comment_id = db.Column(UUIDKey, db.ForeignKey("comment.id"), nullable=False)
+    commenter_id = db.Column(UUIDKey, nullable=False)
     reply_to_username = db.Column(db.String(50), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -414,6 +471,10 @@ class CommentAnswer(db.Model):
         backref=db.backref("liked_comment_replies", lazy=True),
     )
 
+    __table_args__ = (
+        db.Index("ix_comment_answer_comment_created", "comment_id", "created_at"),
+    )
+
     def to_dict(self):
         commenter = User.query.get(self.commenter_id)
         user = User.query.get(self.user_id)
@@ -457,14 +518,23 @@ class CommentAnswer(db.Model):
 
 # Notification model
 class Notification(db.Model):
-    id = db.Column(db.String(36), primary_key=True)
-    user_id = db.Column(db.String(36), db.ForeignKey("user.id"), nullable=False)
-    sender_id = db.Column(db.String(36), nullable=False)
+    id = db.Column(UUIDKey, primary_key=True)
+    user_id = db.Column(UUIDKey, db.ForeignKey("user.id"), nullable=False)
+    sender_id = db.Column(UUIDKey, nullable=False)
     action_type = db.Column(db.String(50), nullable=False)
-    entity_id = db.Column(db.String(36), nullable=False)
+    entity_id = db.Column(UUIDKey, nullable=False)
     entity_type = db.Column(db.String(50), nullable=False)
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    group_key = db.Column(db.String(200), nullable=True)
+    actor_count = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    __table_args__ = (
+        db.Index(
+            "ix_notification_user_read_created", "user_id", "is_read", "created_at"
+        ),
+        db.UniqueConstraint("group_key", name="uq_notification_group_key"),
+    )
 
     def to_dict(self):
         entity = None
@@ -485,6 +555,7 @@ class Notification(db.Model):
             "entity_type": self.entity_type,
             "is_read": self.is_read,
             "created_at": self.created_at,
+            "actor_count": self.actor_count,
             "user": {
                 "username": self.user.username,
                 "image_url": self.user.image_url,
@@ -504,13 +575,21 @@ class Notification(db.Model):
 # Follow model
 class Follow(db.Model):
     __tablename__ = "follow"
-    id = db.Column(db.String(36), primary_key=True)
-    follower_id = db.Column(db.String(36), db.ForeignKey("user.id"))
-    followee_id = db.Column(db.String(36), db.ForeignKey("user.id"))
+    id = db.Column(UUIDKey, primary_key=True)
+    follower_id = db.Column(UUIDKey, db.ForeignKey("user.id"))
+    followee_id = db.Column(UUIDKey, db.ForeignKey("user.id"))
     status = db.Column(db.String(50), default="Pending")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.UniqueConstraint(
+            "follower_id", "followee_id", name="uq_follow_follower_followee"
+        ),
+        db.Index("ix_follow_follower_status", "follower_id", "status"),
+        db.Index("ix_follow_followee_status", "followee_id", "status"),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -524,6 +603,79 @@ class Follow(db.Model):
 
 # Token Blocklist model
 class TokenBlockList(db.Model):
-    id = db.Column(db.String(36), primary_key=True)
+    id = db.Column(UUIDKey, primary_key=True)
     jti = db.Column(db.String(36), nullable=False, index=True)
     created_at = db.Column(db.DateTime, nullable=False)
+
+
+# Outfit search index model
+class OutfitSearchToken(db.Model):
+    __tablename__ = "outfit_search_token"
+    token = db.Column(db.String(200), primary_key=True)
+    outfit_id = db.Column(
+        UUIDKey, db.ForeignKey("outfit.id"), primary_key=True, index=True
+    )
+    field = db.Column(db.String(20), primary_key=True)
+    weight = db.Column(db.Integer, nullable=False, default=1)
+
+
+# Timeline entry model
+class TimelineEntry(db.Model):
+    __tablename__ = "timeline_entry"
+    user_id = db.Column(UUIDKey, db.ForeignKey("user.id"), primary_key=True)
+    outfit_id = db.Column(
+        UUIDKey, db.ForeignKey("outfit.id"), primary_key=True, index=True
+    )
+    author_id = db.Column(UUIDKey, db.ForeignKey("user.id"), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index(
+            "ix_timeline_entry_user_created", "user_id", "created_at", "outfit_id"
+        ),
+        db.Index("ix_timeline_entry_user_author", "user_id", "author_id"),
+    )
+
+
+# Push message outbox model
+class PushMessage(db.Model):
+    __tablename__ = "push_message"
+    id = db.Column(UUIDKey, primary_key=True)
+    to = db.Column(db.String(200), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="Pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(200), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_push_message_status_next_attempt", "status", "next_attempt_at"),
+        db.Index("ix_push_message_to_created", "to", "created_at"),
+    )
+
+
+# Notification event model
+class NotificationEvent(db.Model):
+    __tablename__ = "notification_event"
+    id = db.Column(UUIDKey, primary_key=True)
+    user_id = db.Column(UUIDKey, db.ForeignKey("user.id"), nullable=False)
+    sender_id = db.Column(UUIDKey, nullable=False)
+    action_type = db.Column(db.String(50), nullable=False)
+    entity_id = db.Column(UUIDKey, nullable=False)
+    entity_type = db.Column(db.String(50), nullable=False)
+    # What the event is grouped by when it differs from the entity, e.g. the
+    # outfit for comments, so that comments on one outfit fold together.
+    group_entity_id = db.Column(UUIDKey, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+# Notification actor model
+class NotificationActor(db.Model):
+    __tablename__ = "notification_actor"
+    notification_id = db.Column(
+        UUIDKey, db.ForeignKey("notification.id"), primary_key=True
+    )
+    user_id = db.Column(UUIDKey, db.ForeignKey("user.id"), primary_key=True)
@@ -1,7 +1,6 @@
+from core.links import invalid_urls
 import re
 import random
-import requests
-import json
 
 
 def check_email(email):
@@ -38,26 +37,5 @@ def is_today(date_string):
     return False
 
 
-def send_push_notification(to, title, body):
-    url = "https://exp.host/--/api/v2/push/send"
-    headers = {
-        "host": "exp.host",
-        "Content-Type": "application/json",
-    }
-    payload = json.dumps({"to": to, "title": title, "body": body})
-    requests.post(url, headers=headers, data=payload)
-
-
-import requests
-
-
 def is_valid_url(url):
-    try:
-        response = requests.head(url, allow_redirects=True, timeout=5)
-        if response.status_code == 200:
-            return True
-        else:
-            return False
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return False
+    return not invalid_urls([url])